@@ -2,17 +2,23 @@
 
 
 # Standard library imports
+import re
+import sys
 import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 import os
-from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 # Third-party imports
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.io as pio
+from openpyxl import Workbook
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.platypus import (
@@ -28,6 +34,65 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER
 from reportlab.lib.styles import ParagraphStyle
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import pyarrow as pa
+    from pyarrow import parquet as pa_parquet
+except ImportError:  # pragma: no cover - pyarrow ships with Streamlit
+    pa = None
+    pa_parquet = None
+
+# Local imports
+from engine import (
+    FILTER_CACHE_MAX_BYTES,
+    FilterResultCache,
+    IQR_MULTIPLIER,
+    LATE_ORDER_PAGE_SIZES,
+    OUTLIER_GROUPINGS,
+    TREND_MAX_POINTS,
+    TREND_RESOLUTIONS,
+    build_facet_catalog,
+    build_filter_index,
+    build_late_order_index,
+    build_order_cube,
+    build_po_sketches,
+    build_spend_days,
+    cached_facet_counts,
+    compute_dashboard,
+    compute_dashboard_section,
+    dashboard_key,
+    dashboard_rows,
+    dataset_digest,
+    format_percentage,
+    hll_relative_error,
+    late_order_page,
+    late_order_page_count,
+    late_order_positions,
+    live_facet_counts,
+    outlier_keep_mask,
+    pick_trend_resolution,
+    tab_pdf_sections,
+)
+from ingest import (
+    LINE_SOURCE_COLUMNS,
+    PARSED_CACHE_DIR,
+    SKIPPED_HASH_COLUMN,
+    account_digits,
+    coerce_date_column,
+    create_ingest_pool,
+    default_ingest_workers,
+    is_date_column,
+    normalize_by_unique,
+    purge_parsed_cache,
+    read_source_frame,
+    read_sources,
+)
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="TTU Purchase Orders Log",
@@ -271,25 +336,272 @@ def reset_filters(defaults: Dict[str, Any]) -> None:
     st.experimental_rerun()
 
 
-def _read_source_frame(name: str, payload: bytes) -> pd.DataFrame:
-    buffer = BytesIO(payload)
+def _format_account_code(value: Any) -> str:
+    """Zero-pad an account to eight digits and insert the ``1234-5678`` dash."""
+    digits = account_digits(value).zfill(8)
+    if not digits.strip():
+        return ""
+    return re.sub(r"(\d{4})(\d{4})", r"\1-\2", digits)
+
+
+def _trim_label(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip() or None
+    return value
+
+
+def _format_line_id(value: Any) -> Optional[str]:
+    """Render a PO line number as text, so ``3``, ``3.0`` and ``"3"`` match."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() or None
+
+
+# Per-column cleanup applied by load_and_process_data, one call per distinct value
+COLUMN_NORMALIZERS: Dict[str, Callable[[Any], Any]] = {
+    "VendorName": _trim_label,
+    "Requisitioner": _trim_label,
+}
+
+
+# Declared dtypes of the processed frame. Repeated labels are stored as
+# categoricals so filters and groupbys work on integer codes.
+PROCESSED_SCHEMA = {
+    "__source__": "category",
+    "VendorName": "category",
+    "Requisitioner": "category",
+    "Purchase Account": "category",
+    "POStatus": "category",
+    "POLine": "category",
+    "Total": "float64",
+    "Amt": "float64",
+    "QtyOrdered": "float32",
+    "qty on order/backordered": "float32",
+}
+
+
+def apply_processed_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the columns of ``df`` listed in ``PROCESSED_SCHEMA`` in place."""
+    for col, dtype in PROCESSED_SCHEMA.items():
+        if col in df.columns and df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+PO_STATUS_MAPPING = {
+    "NN": "NEW",
+    "AN": "OPEN",
+    "F": "RECEIVED",
+    "BN": "BACKORDERED",
+}
+
+
+def _map_po_status_code(code: Any) -> Any:
+    return PO_STATUS_MAPPING.get(code, code)
+
+
+def map_po_status(df: pd.DataFrame) -> pd.DataFrame:
+    """Replace POStatus codes with their labels in place; labels already mapped are kept."""
+    if "POStatus" in df.columns:
+        df["POStatus"] = normalize_by_unique(df["POStatus"], _map_po_status_code)
+    return df
+
+
+# Persistent store of processed rows that uploads are appended to
+STORE_PATH = Path(os.environ.get("TTU_STORE_PATH", "data/store/purchase_orders.parquet"))
+# Columns that identify one PO line across monthly exports. A re-exported line
+# replaces the stored one, so status, receipt, quantities and amounts stay current.
+STORE_KEY_COLUMNS = ["PONumber", "POLine"]
+
+
+def _line_ordinals(df: pd.DataFrame) -> pd.Series:
+    """Number each row within its PO and source, 1-based, in stored order.
+
+    Only stores written before lines were keyed get these; uploads without a
+    line column are never appended (see ``append_to_store``).
+    """
+    ordinals = df.groupby(["__source__", "PONumber"], sort=False, dropna=False, observed=True).cumcount() + 1
+    return ordinals.astype(str).astype("category")
+
+
+def store_version() -> Optional[int]:
+    """Return a token that changes whenever the store file is rewritten."""
     try:
-        return pd.read_excel(buffer, engine="openpyxl")
-    except Exception:
-        buffer.seek(0)
-        return pd.read_csv(buffer)
+        return STORE_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_store() -> pd.DataFrame:
+    if not STORE_PATH.exists():
+        return pd.DataFrame()
+    df_store = pd.read_parquet(STORE_PATH)
+    if not df_store.empty and "POLine" not in df_store.columns:
+        # Stores written before lines were keyed get positional line numbers
+        df_store["POLine"] = _line_ordinals(df_store)
+    return df_store
+
+
+@st.cache_data(show_spinner=False)
+def load_store_dataset(version: Optional[int]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Read the store with its sources and digest; ``version`` (see ``store_version``) keys the cache."""
+    df_store = load_store()
+    if df_store.empty:
+        return df_store, {}
+    # Stores appended to before statuses were mapped at load hold raw codes
+    map_po_status(df_store)
+    return df_store, {
+        "sources": [str(name) for name in df_store["__source__"].unique()],
+        "rows": len(df_store),
+        "dataset_digest": dataset_digest(df_store),
+    }
+
+
+# Columns fingerprinted to find duplicate rows; ``None`` means every data
+# column, including the hash of the source columns the parser skipped
+# (``SKIPPED_HASH_COLUMN``; zero for sources with a line column, whose rows
+# PO and line already tell apart), so only rows identical across the whole
+# export match. The source label is never fingerprinted, so rows repeated across two
+# exports count as duplicates too.
+DEDUP_KEY_COLUMNS: Optional[List[str]] = None
+
+
+def _row_fingerprints(df: pd.DataFrame, columns: Sequence[str]) -> pd.Series:
+    """Return a 64-bit hash per row over ``columns``."""
+    return pd.util.hash_pandas_object(df[list(columns)], index=False)
+
+
+def deduplicate_rows(
+    df: pd.DataFrame,
+    key_columns: Optional[Sequence[str]] = None,
+    keep: str = "first",
+) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """Drop rows whose fingerprint over ``key_columns`` was already seen.
+
+    Returns the deduplicated frame and the number of rows removed per
+    ``__source__``, so overlapping exports can be traced to the file that
+    repeated them.
+    """
+    candidates = df.columns if key_columns is None else key_columns
+    columns = [col for col in candidates if col in df.columns and col != "__source__"]
+    duplicated = _row_fingerprints(df, columns).duplicated(keep=keep).to_numpy()
+    removed_by_source: Dict[str, int] = {}
+    if duplicated.any() and "__source__" in df.columns:
+        counts = df.loc[duplicated, "__source__"].value_counts()
+        removed_by_source = {str(source): int(count) for source, count in counts.items() if count}
+    return df.loc[~duplicated], removed_by_source
+
+
+@contextmanager
+def _store_lock() -> Iterator[None]:
+    """Hold an exclusive lock on the store's sidecar ``.lock`` file.
+
+    Every session appends through the same file, so the read, upsert and
+    write of ``append_to_store`` run under this lock; readers are not
+    blocked, since the store is only ever swapped in whole by ``os.replace``.
+    """
+    lock_path = STORE_PATH.with_name(f"{STORE_PATH.name}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def append_to_store(df_new: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """Upsert processed rows into the store and return the merged frame.
+
+    Rows are matched on ``STORE_KEY_COLUMNS``. The returned counters say
+    how many uploaded rows were new, how many replaced a stored row with
+    different values and how many were already stored unchanged. The whole
+    read-modify-write holds ``_store_lock``, so concurrent appends from other
+    sessions are applied one after another instead of overwriting each other.
+
+    Raises ``ValueError`` when ``df_new`` lacks a key column: row positions
+    are no stable line identity, since a partial re-export that drops or
+    reorders lines would overwrite the wrong stored ones.
+    """
+    missing = [col for col in STORE_KEY_COLUMNS if col not in df_new.columns]
+    if missing:
+        raise ValueError(
+            f"the upload has no {' or '.join(missing)} column. Line numbers are read from "
+            f"{', '.join(LINE_SOURCE_COLUMNS)}"
+        )
+    with _store_lock():
+        existing = load_store()
+        stats = {"rows_before": len(existing), "added": 0, "updated": 0, "unchanged": 0}
+        key_columns = STORE_KEY_COLUMNS
+        # Stores written before a column was added lack it, so compare values only
+        # on the columns both frames carry; the concat below fills the rest with NaN.
+        value_columns = [col for col in df_new.columns if col in existing.columns and col != "__source__"]
+
+        if existing.empty:
+            merged = df_new.copy()
+            stats["added"] = len(df_new)
+        else:
+            stored_keys = set(_row_fingerprints(existing, key_columns))
+            stored_rows = set(_row_fingerprints(existing, value_columns))
+            new_keys = _row_fingerprints(df_new, key_columns).isin(stored_keys)
+            new_rows = _row_fingerprints(df_new, value_columns).isin(stored_rows)
+            stats["added"] = int((~new_keys).sum())
+            stats["unchanged"] = int((new_keys & new_rows).sum())
+            stats["updated"] = int((new_keys & ~new_rows).sum())
+            # Categoricals with different categories concatenate as object
+            merged = pd.concat([existing, df_new], ignore_index=True)
+            merged, _ = deduplicate_rows(merged, key_columns, keep="last")
+            apply_processed_schema(merged)
+
+        merged.sort_values("OrderDate", inplace=True)
+        merged.reset_index(drop=True, inplace=True)
+        temp_path = STORE_PATH.with_name(f"{STORE_PATH.name}.{os.getpid()}.tmp")
+        try:
+            merged.to_parquet(temp_path, index=False)
+            os.replace(temp_path, STORE_PATH)
+        finally:
+            temp_path.unlink(missing_ok=True)
+    stats["rows_after"] = len(merged)
+    return merged, stats
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_ingest_pool(workers: int) -> ProcessPoolExecutor:
+    """Keep one parsing pool per server, so workers start once rather than per upload."""
+    return create_ingest_pool(workers)
 
 
 # Caching the data loading function
 @st.cache_data(show_spinner=False)
 def load_and_process_data(
-    file_payloads: Tuple[Tuple[str, bytes], ...], use_demo: bool
+    file_payloads: Tuple[Tuple[str, bytes], ...],
+    use_demo: bool,
+    _ingest_workers: int = 1,
+    use_store: bool = False,
 ) -> Tuple[pd.DataFrame, Dict[str, Any], List[str]]:
+    """Parse, clean and combine the uploaded sources.
+
+    With ``use_store`` duplicate lines are resolved the way the store
+    resolves them (the later export wins). Nothing is written here: the
+    caller appends the result with ``append_to_store`` and reads the store
+    back through ``load_store_dataset``.
+    """
     quality: Dict[str, Any] = {
         "sources": [],
         "rows_loaded": 0,
         "rows_retained": 0,
         "drops": {},
+        "errors": {},
+        "memory": {},
+        "notes": [],
     }
 
     frames: List[pd.DataFrame] = []
@@ -297,19 +609,25 @@ def load_and_process_data(
     if use_demo:
         demo_path = Path("data/demo_purchase_orders.csv")
         if demo_path.exists():
-            df_demo = pd.read_csv(demo_path)
+            df_demo = read_source_frame(demo_path.name, demo_path.read_bytes())
             df_demo["__source__"] = demo_path.name
             frames.append(df_demo)
             quality["sources"].append(demo_path.name)
         else:
             return pd.DataFrame(), quality, []
     else:
-        for name, payload in file_payloads:
-            if payload is None:
-                continue
-            try:
-                df_source = _read_source_frame(name, payload)
-            except Exception:
+        # ``_ingest_workers`` is excluded from the cache key: the worker count
+        # changes how the sources are parsed, not what they contain.
+        sources, pool_error = read_sources(
+            file_payloads, get_ingest_pool(_ingest_workers) if _ingest_workers > 1 else None
+        )
+        if pool_error is not None:
+            # A worker died; start a fresh pool next time
+            get_ingest_pool.clear()
+            quality["notes"].append(f"Parallel parsing was unavailable ({pool_error}); files were parsed one at a time.")
+        for name, df_source, error in sources:
+            if df_source is None:
+                quality["errors"][name] = error
                 continue
             df_source["__source__"] = name
             frames.append(df_source)
@@ -323,9 +641,19 @@ def load_and_process_data(
 
     raw_df.rename(columns={"Acct": "Purchase Account"}, inplace=True)
 
-    date_columns = [col for col in raw_df.columns if "date" in col.lower()]
+    line_columns = [col for col in LINE_SOURCE_COLUMNS if col in raw_df.columns]
+    if line_columns:
+        raw_df["POLine"] = normalize_by_unique(raw_df[line_columns[0]], _format_line_id)
+        raw_df.drop(columns=[col for col in line_columns if col != "POLine"], inplace=True)
+
+    # Every date column leaves this stage as normalized datetime64; the
+    # returned ``date_columns`` list tells callers not to parse them again.
+    # Ingest hands them over already normalized, so only a column that arrives
+    # in another dtype is parsed here.
+    date_columns = [col for col in raw_df.columns if is_date_column(col)]
     for col in date_columns:
-        raw_df[col] = pd.to_datetime(raw_df[col], errors="coerce").dt.normalize()
+        if raw_df[col].dtype != "datetime64[ns]":
+            raw_df[col], _ = coerce_date_column(raw_df[col])
 
     if "OrderDate" not in raw_df.columns:
         quality["drops"]["missing_order_date_column"] = quality["rows_loaded"]
@@ -346,7 +674,14 @@ def load_and_process_data(
     quality["drops"]["critical_missing"] = int(missing_critical)
 
     before_duplicates = len(df_filtered)
-    df_filtered.drop_duplicates(inplace=True)
+    if use_store and not use_demo and "POLine" in df_filtered.columns:
+        # Later exports of the same PO line win, as they do in the store
+        df_filtered, quality["duplicates_by_source"] = deduplicate_rows(
+            df_filtered, STORE_KEY_COLUMNS, keep="last"
+        )
+    else:
+        df_filtered, quality["duplicates_by_source"] = deduplicate_rows(df_filtered, DEDUP_KEY_COLUMNS)
+    df_filtered = df_filtered.drop(columns=[SKIPPED_HASH_COLUMN], errors="ignore")
     quality["drops"]["duplicates_removed"] = int(before_duplicates - len(df_filtered))
 
     numerical_columns = ["Total", "Amt", "QtyOrdered", "QtyRemaining"]
@@ -354,18 +689,19 @@ def load_and_process_data(
         if col in df_filtered.columns:
             df_filtered[col] = pd.to_numeric(df_filtered[col], errors="coerce").fillna(0.0)
 
+    quality["memory"]["before_bytes"] = int(df_filtered.memory_usage(deep=True).sum())
+    for col, normalizer in COLUMN_NORMALIZERS.items():
+        if col in df_filtered.columns:
+            df_filtered[col] = normalize_by_unique(df_filtered[col], normalizer)
+
     if "Purchase Account" in df_filtered.columns:
         before_accounts = len(df_filtered)
-        df_filtered["Purchase Account"] = (
-            df_filtered["Purchase Account"]
-            .astype(str)
-            .str.replace(r"[^0-9]", "", regex=True)
-        )
-        df_filtered["Purchase Account"] = df_filtered["Purchase Account"].str.zfill(8)
-        df_filtered = df_filtered[df_filtered["Purchase Account"].str.strip() != ""]
-        df_filtered["Purchase Account"] = df_filtered["Purchase Account"].str.replace(
-            r"(\d{4})(\d{4})", r"\1-\2", regex=True
+        # Missing accounts are normalized too and end up as 0000-0000
+        df_filtered["Purchase Account"] = normalize_by_unique(
+            df_filtered["Purchase Account"], _format_account_code, normalize_missing=True
         )
+        df_filtered = df_filtered[df_filtered["Purchase Account"] != ""].copy()
+        df_filtered["Purchase Account"] = df_filtered["Purchase Account"].cat.remove_unused_categories()
         quality["drops"]["invalid_purchase_account"] = int(
             before_accounts - len(df_filtered)
         )
@@ -375,55 +711,72 @@ def load_and_process_data(
     df_filtered.rename(
         columns={"QtyRemaining": "qty on order/backordered"}, inplace=True
     )
+    if "POStatus" in df_filtered.columns:
+        map_po_status(df_filtered)
+    else:
+        quality["notes"].append("'POStatus' column is missing.")
+
+    apply_processed_schema(df_filtered)
+    quality["memory"]["after_bytes"] = int(df_filtered.memory_usage(deep=True).sum())
 
     df_filtered.sort_values("OrderDate", inplace=True)
+    # Row positions double as labels for the filter index
+    df_filtered.reset_index(drop=True, inplace=True)
     quality["rows_retained"] = len(df_filtered)
+    quality["dataset_digest"] = dataset_digest(df_filtered)
 
     return df_filtered, quality, date_columns
 
 
-# Map POStatus codes
-def map_po_status(df):
-    po_status_mapping = {
-        "NN": "NEW",
-        "AN": "OPEN",
-        "F": "RECEIVED",
-        "BN": "BACKORDERED",
-    }
-    if "POStatus" in df.columns:
-        df["POStatus"] = df["POStatus"].map(po_status_mapping).fillna(df["POStatus"])
-    else:
-        st.write("'POStatus' column is missing.")
-    return df
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_facet_catalog(digest: str, _index: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the facet catalog once per dataset; ``digest`` identifies ``_index``."""
+    return build_facet_catalog(_index)
+
+
+def _with_count(counts: pd.Series) -> Callable[[Any], str]:
+    return lambda value: f"{value} ({int(counts.get(value, 0)):,})"
 
 
 # Sidebar filter builder
-def build_filter_sidebar(df: pd.DataFrame) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    order_min = df["OrderDate"].min().date()
-    order_max = df["OrderDate"].max().date()
+def build_filter_sidebar(
+    df: pd.DataFrame,
+    index: Optional[Dict[str, Any]] = None,
+    catalog: Optional[Dict[str, Any]] = None,
+    cache: Optional["FilterResultCache"] = None,
+    digest: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    if index is None:
+        index = build_filter_index(df)
+    if catalog is None:
+        catalog = build_facet_catalog(index)
+    ranges = catalog["ranges"]
+    facets = catalog["facets"]
+
+    order_min = ranges["OrderDate"][0].date()
+    order_max = ranges["OrderDate"][1].date()
     defaults: Dict[str, Any] = {
         "order_date_range": (order_min, order_max),
         "purchase_account_filter": "All",
         "requisitioner_filter": "All",
     }
 
-    if "RequestDate" in df.columns and df["RequestDate"].notna().any():
-        request_min = df["RequestDate"].min().date()
-        request_max = df["RequestDate"].max().date()
+    if "RequestDate" in ranges:
+        request_min = ranges["RequestDate"][0].date()
+        request_max = ranges["RequestDate"][1].date()
         defaults["request_date_range"] = (request_min, request_max)
 
-    vendor_options = sorted(df.get("VendorName", pd.Series(dtype=str)).dropna().unique())
+    vendor_options = facets.get("VendorName", {}).get("values", [])
     defaults["vendor_filter"] = vendor_options
 
-    po_status_options = sorted(df.get("POStatus", pd.Series(dtype=str)).dropna().unique())
+    po_status_options = facets.get("POStatus", {}).get("values", [])
     defaults["po_status_filter"] = po_status_options
 
-    total_series = df.get("Total", pd.Series(dtype=float)).dropna()
-    if total_series.empty:
-        total_min, total_max = 0.0, 0.0
+    if "Total" in ranges:
+        total_min = float(ranges["Total"][0])
+        total_max = float(ranges["Total"][1])
     else:
-        total_min = float(total_series.min())
-        total_max = float(total_series.max())
+        total_min, total_max = 0.0, 0.0
     if total_min == total_max:
         total_max = total_min + 1
     defaults["total_range"] = (total_min, total_max)
@@ -432,6 +785,26 @@ def build_filter_sidebar(df: pd.DataFrame) -> Tuple[Dict[str, Any], Dict[str, An
         if key not in st.session_state:
             st.session_state[key] = value
 
+    def state_range(key: str) -> Any:
+        # A date range being picked holds a single date until the second click
+        value = st.session_state.get(key)
+        return value if isinstance(value, (tuple, list)) and len(value) == 2 else defaults.get(key)
+
+    state_filters = {
+        "order_date_range": state_range("order_date_range"),
+        "request_date_range": state_range("request_date_range"),
+        "purchase_account": st.session_state["purchase_account_filter"],
+        "requisitioner": st.session_state["requisitioner_filter"],
+        "vendors": st.session_state["vendor_filter"],
+        "statuses": st.session_state["po_status_filter"],
+        "total_range": state_range("total_range"),
+    }
+    if cache is not None and digest is not None:
+        counts = cached_facet_counts(cache, digest, index, state_filters)
+    else:
+        counts = live_facet_counts(index, state_filters)
+    no_counts = pd.Series(dtype="int64")
+
     with st.sidebar:
         st.markdown("### 🎯 Filters")
 
@@ -449,20 +822,30 @@ def build_filter_sidebar(df: pd.DataFrame) -> Tuple[Dict[str, Any], Dict[str, An
                 key="request_date_range",
             )
 
-        purchase_accounts = ["All"] + sorted(df["Purchase Account"].dropna().unique().tolist())
+        account_counts = counts.get("Purchase Account", no_counts)
+        purchase_accounts = ["All"] + facets.get("Purchase Account", {}).get("values", [])
         selected_account = st.selectbox(
             "Purchase account",
             options=purchase_accounts,
+            format_func=lambda value: (
+                f"All ({int(account_counts.sum()):,})" if value == "All" else _with_count(account_counts)(value)
+            ),
             index=purchase_accounts.index(st.session_state["purchase_account_filter"])
             if st.session_state["purchase_account_filter"] in purchase_accounts
             else 0,
             key="purchase_account_filter",
         )
 
-        requisitioners = ["All"] + sorted(df.get("Requisitioner", pd.Series(dtype=str)).dropna().unique().tolist())
+        requisitioner_counts = counts.get("Requisitioner", no_counts)
+        requisitioners = ["All"] + facets.get("Requisitioner", {}).get("values", [])
         selected_requisitioner = st.selectbox(
             "Requisitioner",
             options=requisitioners,
+            format_func=lambda value: (
+                f"All ({int(requisitioner_counts.sum()):,})"
+                if value == "All"
+                else _with_count(requisitioner_counts)(value)
+            ),
             index=requisitioners.index(st.session_state["requisitioner_filter"])
             if st.session_state["requisitioner_filter"] in requisitioners
             else 0,
@@ -481,6 +864,7 @@ def build_filter_sidebar(df: pd.DataFrame) -> Tuple[Dict[str, Any], Dict[str, An
             "Vendors",
             options=vendor_options,
             default=vendor_default,
+            format_func=_with_count(counts.get("VendorName", no_counts)),
             key="vendor_filter",
         )
 
@@ -496,6 +880,7 @@ def build_filter_sidebar(df: pd.DataFrame) -> Tuple[Dict[str, Any], Dict[str, An
             "PO status",
             options=po_status_options,
             default=status_default,
+            format_func=_with_count(counts.get("POStatus", no_counts)),
             key="po_status_filter",
         )
 
@@ -523,46 +908,64 @@ def build_filter_sidebar(df: pd.DataFrame) -> Tuple[Dict[str, Any], Dict[str, An
     return filters, defaults
 
 
-def apply_filters(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
-    filtered = df.copy()
+# Per-dataset engine structures, built once per server and shared by every session
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_filter_index(digest: str, _df: pd.DataFrame) -> Dict[str, Any]:
+    """Build the filter index once per dataset; ``digest`` identifies ``_df``."""
+    return build_filter_index(_df)
 
-    order_start, order_end = filters["order_date_range"]
-    filtered = filtered[
-        (filtered["OrderDate"] >= pd.to_datetime(order_start))
-        & (filtered["OrderDate"] <= pd.to_datetime(order_end))
-    ]
 
-    request_range = filters.get("request_date_range")
-    if request_range and "RequestDate" in filtered.columns:
-        req_start, req_end = request_range
-        filtered = filtered[
-            (filtered["RequestDate"] >= pd.to_datetime(req_start))
-            & (filtered["RequestDate"] <= pd.to_datetime(req_end))
-        ]
+@st.cache_resource(show_spinner=False)
+def get_filter_result_cache() -> FilterResultCache:
+    return FilterResultCache(FILTER_CACHE_MAX_BYTES)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_order_cube(digest: str, _df: pd.DataFrame, _index: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the order cube once per dataset; ``digest`` identifies ``_df``."""
+    return build_order_cube(_df, _index)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_po_sketches(digest: str, _df: pd.DataFrame, _cube: Dict[str, Any]) -> Dict[str, Tuple[np.ndarray, ...]]:
+    """Build the PONumber HyperLogLog entries once per dataset, on first use."""
+    return build_po_sketches(_df, _cube)
 
-    if filters.get("purchase_account") and filters["purchase_account"] != "All":
-        filtered = filtered[filtered["Purchase Account"] == filters["purchase_account"]]
 
-    if filters.get("requisitioner") and filters["requisitioner"] != "All":
-        filtered = filtered[filtered["Requisitioner"] == filters["requisitioner"]]
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_outlier_mask(digest: str, group_col: Optional[str], _df: pd.DataFrame) -> np.ndarray:
+    """Build the outlier keep-mask once per dataset and grouping."""
+    return outlier_keep_mask(_df, group_col)
 
-    if filters.get("vendors"):
-        filtered = filtered[filtered["VendorName"].isin(filters["vendors"])]
 
-    if filters.get("statuses"):
-        filtered = filtered[filtered["POStatus"].isin(filters["statuses"])]
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_spend_days(digest: str, _df: pd.DataFrame) -> Dict[str, Any]:
+    """Build the order-day codes of the spend pyramid once per dataset."""
+    return build_spend_days(_df["OrderDate"], _df["Total"])
 
-    total_min, total_max = filters.get("total_range", (None, None))
-    if total_min is not None and total_max is not None and "Total" in filtered.columns:
-        filtered = filtered[(filtered["Total"] >= total_min) & (filtered["Total"] <= total_max)]
 
-    return filtered
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_late_order_index(key: Tuple[Any, ...], _late_orders: pd.DataFrame) -> Dict[str, Any]:
+    """Build the late-order viewer index once per dashboard result."""
+    return build_late_order_index(_late_orders)
+
+
+# Dashboard tabs -> the sections they render
+DASHBOARD_TABS = {
+    "Delivery Health": ("delivery",),
+    "Purchase Accounts": ("accounts",),
+    "Requisitioners": ("requisitioners",),
+    "Lead Times": ("lead_times",),
+}
 
 
 def render_data_quality(quality: Dict[str, Any]) -> None:
     drops = quality.get("drops", {})
+    errors = quality.get("errors", {})
+    memory = quality.get("memory", {})
+    notes = quality.get("notes", [])
     total_dropped = sum(drops.values())
-    if total_dropped == 0:
+    if total_dropped == 0 and not errors and not memory and not notes and not quality.get("store"):
         return
 
     reason_labels = {
@@ -585,9 +988,30 @@ def render_data_quality(quality: Dict[str, Any]) -> None:
         for reason, count in drops.items():
             if count:
                 label = reason_labels.get(reason, reason.replace("_", " ").title())
-                st.markdown(f"- {label}: **{int(count):,}**")
+                lines = [f"- {label}: **{int(count):,}**"]
+                if reason == "duplicates_removed":
+                    lines += [
+                        f"    - from {source}: {removed:,}"
+                        for source, removed in quality.get("duplicates_by_source", {}).items()
+                    ]
+                st.markdown("\n".join(lines))
         if retained:
             st.caption(f"Rows available for analysis: {retained:,}")
+        for source, error in errors.items():
+            st.markdown(f"- Could not read **{source}**: {error}")
+        for note in notes:
+            st.caption(note)
+        store = quality.get("store", {})
+        if "added" in store:
+            st.caption(
+                f"Local store: {store['added']:,} rows added, {store['updated']:,} updated, "
+                f"{store['unchanged']:,} unchanged ({store['rows_before']:,} → {store['rows_after']:,} rows)."
+            )
+        if memory.get("after_bytes"):
+            st.caption(
+                f"In-memory footprint: {memory['before_bytes'] / 1_048_576:,.1f} MB before typing, "
+                f"{memory['after_bytes'] / 1_048_576:,.1f} MB with the compact schema."
+            )
 
 
 # Create index cards
@@ -644,43 +1068,146 @@ def plotly_to_image(fig, format="png", **kwargs):
         return None
 
 
-def format_currency(value) -> str:
-    """Return the value formatted as a currency string."""
-    try:
-        if pd.isna(value):
-            return "$0.00"
-        return f"${float(value):,.2f}"
-    except (TypeError, ValueError):
-        return "$0.00"
+# Export formats: label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+EXPORT_CHUNK_ROWS = 50_000
+EXCEL_MAX_ROWS = 1_048_575
 
 
-def format_percentage(value) -> str:
-    try:
-        return f"{value:.2f}%"
-    except (TypeError, ValueError):
-        return "0.00%"
-# Generate matrix of on-time delivery metrics by GL account (Purchase Account)
-def otd_matrix_by_account(df: pd.DataFrame) -> pd.DataFrame:
-    """Return on-time and late counts with percentage by Purchase Account."""
-    required_cols = {"RecDate", "RequestDate", "Purchase Account"}
-    if not required_cols.issubset(df.columns):
-        return pd.DataFrame()
+def export_filtered_data(df: pd.DataFrame, fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> BytesIO:
+    """Serialize ``df`` in an ``EXPORT_FORMATS`` format, ``chunk_rows`` rows at a time.
+
+    CSV chunks are appended as text, Parquet chunks become row groups and
+    Excel rows stream through a write-only workbook, which openpyxl stages
+    in a temporary file before zipping it into the buffer. Besides ``df``,
+    peak memory is the finished file plus one chunk being converted. The
+    filled buffer is returned rewound rather than copied out;
+    ``st.download_button`` reads it with ``getvalue()``, which in CPython
+    hands over the buffer's bytes instead of copying them.
+    """
+    if fmt == "Excel" and len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"Excel sheets hold at most {EXCEL_MAX_ROWS:,} rows; export {len(df):,} rows as CSV or Parquet.")
+    chunks = (df.iloc[start : start + chunk_rows] for start in range(0, max(len(df), 1), chunk_rows))
+    buffer = BytesIO()
+    if fmt == "CSV":
+        for number, chunk in enumerate(chunks):
+            buffer.write(chunk.to_csv(index=False, header=number == 0).encode("utf-8"))
+    elif fmt == "Parquet":
+        if pa_parquet is None:
+            df.to_parquet(buffer, index=False)
+        else:
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            with pa_parquet.ParquetWriter(buffer, schema) as writer:
+                for chunk in chunks:
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    elif fmt == "Excel":
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Purchase Orders")
+        sheet.append(list(df.columns))
+        for chunk in chunks:
+            for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+                sheet.append(row)
+        workbook.save(buffer)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    buffer.seek(0)
+    return buffer
+
+
+CHART_LAYOUT = dict(
+    title_font=dict(color="#1f4e79", size=16),
+    plot_bgcolor="rgba(0,0,0,0)",
+    paper_bgcolor="rgba(0,0,0,0)",
+)
 
-    temp = df.copy()
-    temp["RecDate"] = pd.to_datetime(temp["RecDate"]).dt.normalize()
-    temp["RequestDate"] = pd.to_datetime(temp["RequestDate"]).dt.normalize()
-    temp["On_Time"] = temp["RecDate"] <= temp["RequestDate"]
 
-    summary = (
-        temp.groupby("Purchase Account")["On_Time"]
-        .agg(On_Time="sum", Late=lambda x: (~x).sum())
-        .reset_index()
+def spend_trend_figure(spend_chart: pd.DataFrame, resolution: str) -> Any:
+    fig = px.line(
+        spend_chart,
+        x="Order Period",
+        y="Total Spend",
+        markers=True,
+        hover_data=["Period", "Order Lines"],
+        title=f"Spend Over Time ({resolution.lower()})",
     )
-    summary["On-Time %"] = (
-        summary["On_Time"] / (summary["On_Time"] + summary["Late"]) * 100
-    ).round(2)
-    summary.rename(columns={"On_Time": "On-Time"}, inplace=True)
-    return summary
+    fig.update_layout(**CHART_LAYOUT, hovermode="x unified", yaxis_tickprefix="$")
+    return fig
+
+
+def top_vendor_figure(vendor_chart: pd.DataFrame) -> Any:
+    fig = px.bar(vendor_chart, x="VendorName", y="Total", title="Top Vendors by Spend", text_auto=".2s")
+    fig.update_layout(**CHART_LAYOUT, yaxis_tickprefix="$", xaxis_tickangle=-35)
+    return fig
+
+
+def lead_time_trend_figure(lead_time_trend: pd.DataFrame) -> Any:
+    fig = px.line(
+        lead_time_trend,
+        x="Order Month",
+        y=[col for col in lead_time_trend.columns if col.startswith("Lead Time")],
+        markers=True,
+        title="Lead Time by Order Month",
+    )
+    fig.update_layout(**CHART_LAYOUT, hovermode="x unified", yaxis_title="Days", legend_title_text="")
+    return fig
+
+
+CHART_BUILDERS: Dict[str, Callable[..., Any]] = {
+    "spend_trend": spend_trend_figure,
+    "top_vendors": top_vendor_figure,
+    "lead_time_trend": lead_time_trend_figure,
+}
+
+
+# Upper bound on memory held by cached chart JSON
+CHART_CACHE_MAX_BYTES = int(os.environ.get("TTU_CHART_CACHE_MAX_MB", "32")) * 1024 * 1024
+
+
+@st.cache_resource(show_spinner=False)
+def get_chart_cache() -> FilterResultCache:
+    return FilterResultCache(CHART_CACHE_MAX_BYTES)
+
+
+def cached_chart(chart: str, frame: pd.DataFrame, *options: Any) -> Any:
+    """Return a fresh figure for ``frame``, rebuilt from JSON cached by a hash of the aggregate itself.
+
+    Only the serialized figure is shared between sessions, so callers get their
+    own Figure and may modify it.
+    """
+    cache = get_chart_cache()
+    key = (chart, dataset_digest(frame), options)
+    figure_json = cache.get(key)
+    if figure_json is None:
+        figure_json = CHART_BUILDERS[chart](frame, *options).to_json()
+        cache.put(key, figure_json)
+    return pio.from_json(figure_json)
+
+
+# Columns shown as dollars. They stay numeric so column sorting works; the
+# Styler formats only what is drawn, with the thousands separators that
+# Streamlit's printf-style NumberColumn formats lack.
+CURRENCY_COLUMNS = ["Total Value", "Open Amount", "Avg Order Value", "Late Order Value", "Total Amount"]
+CURRENCY_DISPLAY_FORMAT = "${:,.2f}"
+
+
+def display_frame(frame: pd.DataFrame) -> Any:
+    """Return ``frame`` for ``st.dataframe``, styled to show currency columns as ``$1,234.56``."""
+    currency_cols = [col for col in CURRENCY_COLUMNS if col in frame.columns]
+    if not currency_cols:
+        return frame
+    return frame.style.format({col: CURRENCY_DISPLAY_FORMAT for col in currency_cols}, na_rep="$0.00")
+
+
+def display_column_config(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Return ``st.dataframe`` column formats for the date columns of ``frame``."""
+    config: Dict[str, Any] = {}
+    for col in frame.select_dtypes(include="datetime").columns:
+        config[col] = st.column_config.DateColumn(col, format="YYYY-MM-DD")
+    return config
 
 
 # Main application logic
@@ -697,22 +1224,57 @@ def main():
         st.markdown("### 📁 Data source")
         uploaded_files = st.file_uploader(
             "Upload Excel workbooks",
-            type=["xlsx"],
+            type=["xlsx", "xls", "csv"],
             accept_multiple_files=True,
-            help="Upload one or more monthly exports to merge them automatically.",
+            help="Upload one or more monthly exports (Excel or CSV) to merge them automatically.",
         )
         st.caption("Uploaded files are merged in the order you select.")
+        store_exists = STORE_PATH.exists()
+        use_store = st.toggle(
+            "Use local store",
+            value=store_exists,
+            help="Append uploads to a persistent local store and open it when nothing is uploaded.",
+        )
         use_demo = st.toggle(
             "Use demo dataset",
-            value=not uploaded_files,
+            value=not uploaded_files and not (use_store and store_exists),
             help="Load a bundled sample workbook to explore the dashboard.",
         )
+        ingest_workers = st.number_input(
+            "Parsing workers",
+            min_value=1,
+            max_value=max(os.cpu_count() or 1, default_ingest_workers()),
+            value=default_ingest_workers(),
+            step=1,
+            help="Number of processes used to parse uploaded workbooks in parallel.",
+        )
+        approximate_counts = st.toggle(
+            "Approximate PO counts",
+            value=False,
+            help=(
+                "Estimate distinct purchase orders with HyperLogLog sketches instead of exact counts. "
+                f"Faster on very large histories; typical error ±{hll_relative_error():.1%}."
+            ),
+        )
+        outlier_choice = st.selectbox(
+            "Chart outliers",
+            options=["Keep all", *OUTLIER_GROUPINGS],
+            format_func=lambda option: option if option == "Keep all" else f"Drop by IQR ({option.lower()})",
+            help=f"Leave lines beyond {IQR_MULTIPLIER}×IQR of their group out of the spend charts; tables keep every line.",
+        )
+        chart_outliers = None if outlier_choice == "Keep all" else outlier_choice
+        if st.button("Clear parsed-file cache", help="Forget previously parsed workbooks so they are read again."):
+            removed = purge_parsed_cache()
+            load_and_process_data.clear()
+            st.caption(f"Removed {removed} cached file{'s' if removed != 1 else ''}.")
         if uploaded_files:
             st.success(
                 f"✅ {len(uploaded_files)} file{'s' if len(uploaded_files) > 1 else ''} ready for analysis."
             )
         elif use_demo:
             st.info("Demo dataset is active.")
+        elif use_store and store_exists:
+            st.info("Local store is active; upload new exports to append them.")
         st.markdown("---")
 
     processing_start_time = time.time()
@@ -722,20 +1284,119 @@ def main():
         else tuple()
     )
 
-    df_processed, quality, date_columns = load_and_process_data(file_payloads, use_demo)
+    df_processed, quality, date_columns = load_and_process_data(
+        file_payloads,
+        use_demo,
+        int(ingest_workers),
+        use_store=use_store,
+    )
+    if use_store and not use_demo:
+        # Append each upload once per session. Writes from other sessions change
+        # the store but not the upload, so they must not replay this session's
+        # older export; only a fresh upload (new file ids) appends again.
+        store_refused = False
+        if not df_processed.empty:
+            upload_key = tuple(uploaded_file.file_id for uploaded_file in uploaded_files)
+            appended = st.session_state.setdefault("store_appended", {})
+            try:
+                if upload_key not in appended:
+                    _, appended[upload_key] = append_to_store(df_processed)
+                quality["store"] = appended[upload_key]
+            except ValueError as exc:
+                store_refused = True
+                st.error(
+                    f"This upload was not added to the local store: {exc}. Without line numbers a later "
+                    "re-export could overwrite the wrong stored lines, so the dashboard shows the upload on its own."
+                )
+        df_store, store_info = (pd.DataFrame(), {}) if store_refused else load_store_dataset(store_version())
+        if not df_store.empty:
+            df_processed = df_store
+            quality["sources"] = store_info["sources"]
+            quality["rows_retained"] = store_info["rows"]
+            quality["dataset_digest"] = store_info["dataset_digest"]
+            if not file_payloads:
+                quality["rows_loaded"] = store_info["rows"]
+                quality["store"] = {"rows_after": store_info["rows"]}
+    if quality.get("errors"):
+        failed = len(quality["errors"])
+        st.warning(
+            f"{failed} file{'s' if failed > 1 else ''} could not be read — see the data quality checks in the sidebar."
+        )
     if df_processed.empty:
         render_data_quality(quality)
         st.info("Upload at least one Excel workbook or enable the demo dataset from the sidebar to begin.")
         return
 
-    df_processed = map_po_status(df_processed)
+    filter_index = get_filter_index(quality["dataset_digest"], df_processed)
 
-    filters, defaults = build_filter_sidebar(df_processed)
+    facet_catalog = get_facet_catalog(quality["dataset_digest"], filter_index)
+    filter_cache = get_filter_result_cache()
+    filters, defaults = build_filter_sidebar(
+        df_processed, filter_index, facet_catalog, filter_cache, quality["dataset_digest"]
+    )
     render_data_quality(quality)
 
-    df_filtered = apply_filters(df_processed, filters)
+    filter_key = dashboard_key(quality["dataset_digest"], filters, approximate_counts, chart_outliers)
+    dashboard = filter_cache.get(filter_key)
+    if dashboard is None:
+        order_cube = get_order_cube(quality["dataset_digest"], df_processed, filter_index)
+        dashboard = compute_dashboard(
+            df_processed,
+            filters,
+            index=filter_index,
+            cube=order_cube,
+            digest=quality["dataset_digest"],
+            approximate=approximate_counts,
+            sketches=(
+                get_po_sketches(quality["dataset_digest"], df_processed, order_cube) if approximate_counts else None
+            ),
+            outliers=chart_outliers,
+            keep_mask=(
+                get_outlier_mask(quality["dataset_digest"], OUTLIER_GROUPINGS[chart_outliers], df_processed)
+                if chart_outliers
+                else None
+            ),
+            spend_days=(
+                get_spend_days(quality["dataset_digest"], df_processed)
+                if {"OrderDate", "Total"}.issubset(df_processed.columns)
+                else None
+            ),
+        )
+        filter_cache.put(dashboard.key, dashboard)
+
+    def load_rows() -> pd.DataFrame:
+        """Return the filtered rows, taking them once per filter state if the cube answered without them."""
+        rows = filter_cache.get((dashboard.key, "rows"))
+        if rows is None:
+            rows = dashboard_rows(dashboard, df_processed, filters, filter_index)
+            if dashboard.frame is None:
+                filter_cache.put((dashboard.key, "rows"), rows)
+        return rows
+
+    def load_sections(names: Sequence[str]) -> Dict[str, Any]:
+        """Return the tables of ``names``, computing only sections not cached for this filter state."""
+        loaded: Dict[str, Any] = {}
+        section_cube = section_sketches = None
+        for name in names:
+            section = filter_cache.get((dashboard.key, name))
+            if section is None:
+                # Row results need neither, except the PO sketches (built against the cube) when approximate
+                if section_cube is None and (dashboard.cell_mask is not None or dashboard.approximate):
+                    section_cube = get_order_cube(quality["dataset_digest"], df_processed, filter_index)
+                    if dashboard.approximate:
+                        section_sketches = get_po_sketches(quality["dataset_digest"], df_processed, section_cube)
+                section = compute_dashboard_section(
+                    dashboard,
+                    name,
+                    cube=section_cube,
+                    sketches=section_sketches,
+                    load_frame=load_rows,
+                )
+                filter_cache.put((dashboard.key, name), section)
+            loaded.update(section)
+        return loaded
 
-    if df_filtered.empty:
+    if dashboard.kpis["line_items"] == 0:
         st.warning("No results found for the selected filters. Try adjusting them in the sidebar.")
         return
 
@@ -747,30 +1408,66 @@ def main():
     selected_requisitioner = filters["requisitioner"]
     selected_purchase_account = filters["purchase_account"]
 
-    total_line_items = len(df_filtered)
-    total_unique_pos = df_filtered["PONumber"].nunique() if "PONumber" in df_filtered.columns else total_line_items
+    kpis = dashboard.kpis
+    total_line_items = kpis["line_items"]
+    total_unique_pos = kpis["unique_pos"]
 
     summary_col1, summary_col2 = st.columns([3, 2])
     with summary_col1:
         st.markdown(
             f"**Analyzing {total_line_items:,} line items across {total_unique_pos:,} purchase orders.**"
         )
+        if dashboard.approximate:
+            st.caption(
+                f"Purchase order counts are HyperLogLog estimates (typical error ±{hll_relative_error():.1%}); "
+                "turn off approximate PO counts in the sidebar for exact figures."
+            )
         if quality.get("sources"):
             st.caption("Sources merged: " + ", ".join(quality["sources"]))
+        store = quality.get("store", {})
+        if "added" in store:
+            st.caption(
+                f"Appended to the local store: {store['added']:,} new and {store['updated']:,} updated rows "
+                f"({store['rows_after']:,} rows stored)."
+            )
         total_removed = sum(quality.get("drops", {}).values())
         if total_removed:
             st.caption(f"Data cleaning removed {total_removed:,} rows — see the sidebar for details.")
     with summary_col2:
-        st.download_button(
-            label="Download filtered data (CSV)",
-            data=df_filtered.to_csv(index=False).encode("utf-8"),
-            file_name="ttu_purchase_orders_filtered.csv",
-            mime="text/csv",
+        export_format = st.selectbox(
+            "Export filtered data",
+            list(EXPORT_FORMATS),
+            key="export_format",
+            help="Parquet is the quickest to write and smallest; large Excel exports take longest.",
         )
+        # Each session keeps only its latest export, apart from the shared filter
+        # cache; it is released once the filters or format change.
+        export_key = (dashboard.key, export_format)
+        export_data = None
+        prepared = st.session_state.get("export_payload")
+        if prepared is not None and prepared[0] == export_key:
+            export_data = prepared[1]
+        elif prepared is not None:
+            del st.session_state["export_payload"]
+        if export_data is None and st.button(f"Prepare {export_format} export", key="prepare_export"):
+            try:
+                with st.spinner(f"Writing {total_line_items:,} rows..."):
+                    export_data = export_filtered_data(load_rows(), export_format)
+                st.session_state["export_payload"] = (export_key, export_data)
+            except ValueError as exc:
+                st.warning(str(exc))
+        if export_data is not None:
+            extension, mime = EXPORT_FORMATS[export_format]
+            st.download_button(
+                label=f"Download filtered data ({export_format})",
+                data=export_data,
+                file_name=f"ttu_purchase_orders_filtered.{extension}",
+                mime=mime,
+            )
 
     metrics = {}
-    if "Amt" in df_filtered.columns and "POStatus" in df_filtered.columns:
-        total_open_orders_amt = df_filtered[df_filtered["POStatus"] == "OPEN"]["Amt"].sum()
+    if "Amt" in df_processed.columns and "POStatus" in df_processed.columns:
+        total_open_orders_amt = kpis["open_amount"]
         metrics["Total Open Orders Amt"] = {
             "Total Open Orders Amt": f"${total_open_orders_amt:,.2f}",
             "bg_color": "rgba(144, 202, 249, 0.45)",
@@ -781,8 +1478,8 @@ def main():
             "bg_color": "rgba(144, 202, 249, 0.45)",
         }
 
-    if "PONumber" in df_filtered.columns:
-        total_orders_placed = df_filtered["PONumber"].nunique()
+    if "PONumber" in df_processed.columns:
+        total_orders_placed = total_unique_pos
         metrics["Total Orders Placed"] = {
             "Total Orders Placed": f"{total_orders_placed}",
             "bg_color": "rgba(255, 205, 210, 0.45)",
@@ -793,8 +1490,9 @@ def main():
         "bg_color": "rgba(200, 230, 201, 0.45)",
     }
 
-    if {"Total", "PONumber", "VendorName", "Requisitioner"}.issubset(df_filtered.columns):
-        max_total_row = df_filtered.loc[df_filtered["Total"].idxmax()]
+    if {"Total", "PONumber", "VendorName", "Requisitioner"}.issubset(df_processed.columns):
+        # Row labels are shared with the processed frame, so no filtered rows are needed
+        max_total_row = df_processed.loc[kpis["max_total_label"]]
         max_total_formatted = f"${max_total_row['Total']:,.2f}"
         most_expensive_order_info = (
             f"PO Number: {max_total_row['PONumber']}<br/>"
@@ -814,356 +1512,76 @@ def main():
 
     display_index_cards(metrics)
 
-    if selected_requisitioner != "All":
-        last_order = df_filtered.sort_values(by="OrderDate", ascending=False).head(1)
-        if not last_order.empty:
-            last_order_row = last_order.iloc[0]
-            last_order_info = (
-                f"Order Date: {last_order_row['OrderDate'].date()}<br/>"
-                f"PO Number: {last_order_row['PONumber']}<br/>"
-                f"Vendor: {last_order_row['VendorName']}<br/>"
-                f"Total: ${last_order_row['Total']:,.2f}<br/>"
-                f"Status: {last_order_row['POStatus']}"
-            )
-            st.markdown(
-                f"""
+    if dashboard.last_order is not None:
+        last_order_row = dashboard.last_order
+        last_order_info = (
+            f"Order Date: {last_order_row['OrderDate'].date()}<br/>"
+            f"PO Number: {last_order_row['PONumber']}<br/>"
+            f"Vendor: {last_order_row['VendorName']}<br/>"
+            f"Total: ${last_order_row['Total']:,.2f}<br/>"
+            f"Status: {last_order_row['POStatus']}"
+        )
+        st.markdown(
+            f"""
                 <div class="card" style='background-color: rgba(187, 222, 251, 0.55); width: 100%;'>
                     <h3>Last Order for {selected_requisitioner}</h3>
                     <p>{last_order_info}</p>
                 </div>
                 """,
-                unsafe_allow_html=True,
-            )
+            unsafe_allow_html=True,
+        )
 
     st.markdown("### 📊 Trends & Insights")
-    trend_summary = pd.DataFrame()
-    vendor_summary_pdf = pd.DataFrame()
+    trend_summary = dashboard.tables["trend_summary"]
+    vendor_summary_pdf = dashboard.tables["vendor_summary"]
     pdf_sections = []
 
-    if {"OrderDate", "Total"}.issubset(df_filtered.columns):
-        trend_df = df_filtered.copy()
-        trend_df["OrderDate"] = pd.to_datetime(trend_df["OrderDate"], errors="coerce")
-        trend_df.dropna(subset=["OrderDate"], inplace=True)
-        if not trend_df.empty:
-            trend_df["Order Month"] = trend_df["OrderDate"].dt.to_period("M").dt.to_timestamp()
-            agg_dict = {"total_spend": ("Total", "sum")}
-            if "PONumber" in trend_df.columns:
-                agg_dict["unique_pos"] = ("PONumber", "nunique")
-            else:
-                agg_dict["unique_pos"] = ("Total", "size")
-            trend_summary = trend_df.groupby("Order Month").agg(**agg_dict).reset_index()
-            trend_summary.rename(
-                columns={"total_spend": "Total Spend", "unique_pos": "Unique POs"}, inplace=True
-            )
-
-    if {"VendorName", "Total"}.issubset(df_filtered.columns):
-        vendor_summary_pdf = (
-            df_filtered.groupby("VendorName")["Total"].sum().reset_index().sort_values("Total", ascending=False)
-        )
-        vendor_summary_pdf = vendor_summary_pdf.head(10)
-
+    vendor_chart = dashboard.tables.get("vendor_chart", vendor_summary_pdf)
     chart_col1, chart_col2 = st.columns(2)
     with chart_col1:
-        if not trend_summary.empty:
-            spend_fig = px.line(
-                trend_summary,
-                x="Order Month",
-                y="Total Spend",
-                markers=True,
-                title="Spend Over Time",
-            )
-            spend_fig.update_layout(
-                title_font=dict(color="#1f4e79", size=16),
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                hovermode="x unified",
-                yaxis_tickprefix="$",
-            )
-            st.plotly_chart(spend_fig, use_container_width=True)
+        resolution_choice = st.radio(
+            "Trend resolution",
+            options=["Auto", *TREND_RESOLUTIONS],
+            horizontal=True,
+            key="trend_resolution",
+            help=f"Auto picks the finest resolution that fits in {TREND_MAX_POINTS} points.",
+        )
+        resolution = (
+            pick_trend_resolution(dashboard.spend_pyramid) if resolution_choice == "Auto" else resolution_choice
+        )
+        spend_chart = dashboard.spend_pyramid.get(resolution, pd.DataFrame())
+        if not spend_chart.empty:
+            st.plotly_chart(cached_chart("spend_trend", spend_chart, resolution), use_container_width=True)
     with chart_col2:
-        if not vendor_summary_pdf.empty:
-            vendor_fig = px.bar(
-                vendor_summary_pdf,
-                x="VendorName",
-                y="Total",
-                title="Top Vendors by Spend",
-                text_auto=".2s",
-            )
-            vendor_fig.update_layout(
-                title_font=dict(color="#1f4e79", size=16),
-                plot_bgcolor="rgba(0,0,0,0)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                yaxis_tickprefix="$",
-                xaxis_tickangle=-35,
-            )
-            st.plotly_chart(vendor_fig, use_container_width=True)
+        if not vendor_chart.empty:
+            st.plotly_chart(cached_chart("top_vendors", vendor_chart), use_container_width=True)
+    if chart_outliers:
+        st.caption(
+            f"Charts leave out {dashboard.chart_outliers:,} outlier line{'s' if dashboard.chart_outliers != 1 else ''} "
+            f"beyond {IQR_MULTIPLIER}×IQR ({chart_outliers.lower()}); tables and the PDF include every line."
+        )
 
     if not trend_summary.empty:
         pdf_sections.append(("Spend Trend by Month", trend_summary.copy(), None))
     if not vendor_summary_pdf.empty:
         pdf_sections.append(("Top Vendors by Spend", vendor_summary_pdf.copy(), None))
 
-    delivery_insights = []
-    delivery_ready = False
-    delivery_message = ""
-    delivery_summary_pdf = pd.DataFrame()
-    delivery_summary_display = pd.DataFrame()
-    late_df = pd.DataFrame()
-    late_account_summary_pdf = pd.DataFrame()
-    late_requisitioner_summary_pdf = pd.DataFrame()
-    late_pos_display = pd.DataFrame()
-    late_pos_pdf = pd.DataFrame()
-    on_time_percentage = 0.0
-    late_percentage = 0.0
-
-    if {"RecDate", "RequestDate"}.issubset(df_filtered.columns):
-        df_delivery = df_filtered.dropna(subset=["RecDate", "RequestDate"]).copy()
-        df_delivery["RecDate"] = pd.to_datetime(df_delivery["RecDate"], errors="coerce").dt.normalize()
-        df_delivery["RequestDate"] = pd.to_datetime(df_delivery["RequestDate"], errors="coerce").dt.normalize()
-        df_delivery.dropna(subset=["RecDate", "RequestDate"], inplace=True)
-
-        if not df_delivery.empty:
-            on_time_mask = df_delivery["RecDate"] <= df_delivery["RequestDate"]
-            on_time_pos = df_delivery[on_time_mask]
-            late_df = df_delivery[~on_time_mask]
-            on_time_count = (
-                on_time_pos["PONumber"].nunique() if "PONumber" in df_delivery.columns else len(on_time_pos)
-            )
-            late_count = (
-                late_df["PONumber"].nunique() if "PONumber" in df_delivery.columns else len(late_df)
-            )
-            total_pos = on_time_count + late_count
-
-            delivery_summary_pdf = pd.DataFrame(
-                {
-                    "Metric": [
-                        "On-Time Orders",
-                        "Late Orders",
-                        "Total Orders",
-                        "On-Time %",
-                        "Late %",
-                    ],
-                    "Value": [
-                        on_time_count,
-                        late_count,
-                        total_pos,
-                        round((on_time_count / total_pos) * 100, 2) if total_pos else 0.0,
-                        round((late_count / total_pos) * 100, 2) if total_pos else 0.0,
-                    ],
-                }
-            )
-
-            if total_pos > 0:
-                on_time_percentage = (on_time_count / total_pos) * 100
-                late_percentage = 100 - on_time_percentage
-                delivery_ready = True
-            else:
-                delivery_message = "No purchase orders have both request and receive dates within the selected filters."
-
-            delivery_summary_display = delivery_summary_pdf.copy()
-            delivery_summary_display.loc[0:2, "Value"] = delivery_summary_display.loc[0:2, "Value"].map(
-                lambda x: f"{int(x):,}"
-            )
-            delivery_summary_display.loc[3:4, "Value"] = delivery_summary_display.loc[3:4, "Value"].map(
-                format_percentage
-            )
-
-            if not late_df.empty:
-                late_df["Days Late"] = (late_df["RecDate"] - late_df["RequestDate"]).dt.days
-                late_account_summary_pdf = (
-                    late_df.groupby("Purchase Account")
-                    .agg(
-                        Late_Orders=("PONumber", "nunique"),
-                        Late_Lines=("PONumber", "size"),
-                        Avg_Days_Late=("Days Late", "mean"),
-                        Max_Days_Late=("Days Late", "max"),
-                        Late_Order_Value=("Total", "sum"),
-                    )
-                    .reset_index()
-                )
-                late_account_summary_pdf.sort_values(
-                    by=["Late_Orders", "Late_Order_Value"], ascending=False, inplace=True
-                )
-                late_account_summary_pdf["Avg_Days_Late"] = late_account_summary_pdf["Avg_Days_Late"].round(1)
-                late_account_summary_pdf.rename(
-                    columns={
-                        "Late_Orders": "Late Orders",
-                        "Late_Lines": "Late Lines",
-                        "Avg_Days_Late": "Avg Days Late",
-                        "Max_Days_Late": "Max Days Late",
-                        "Late_Order_Value": "Late Order Value",
-                    },
-                    inplace=True,
-                )
-                late_account_summary_pdf["Max Days Late"] = late_account_summary_pdf["Max Days Late"].fillna(0).astype(int)
-
-                late_requisitioner_summary_pdf = (
-                    late_df.groupby("Requisitioner")
-                    .agg(
-                        Late_Orders=("PONumber", "nunique"),
-                        Late_Lines=("PONumber", "size"),
-                        Avg_Days_Late=("Days Late", "mean"),
-                        Max_Days_Late=("Days Late", "max"),
-                        Late_Order_Value=("Total", "sum"),
-                    )
-                    .reset_index()
-                )
-                late_requisitioner_summary_pdf.sort_values(
-                    by=["Late_Orders", "Late_Order_Value"], ascending=False, inplace=True
-                )
-                late_requisitioner_summary_pdf["Avg_Days_Late"] = late_requisitioner_summary_pdf["Avg_Days_Late"].round(1)
-                late_requisitioner_summary_pdf.rename(
-                    columns={
-                        "Late_Orders": "Late Orders",
-                        "Late_Lines": "Late Lines",
-                        "Avg_Days_Late": "Avg Days Late",
-                        "Max_Days_Late": "Max Days Late",
-                        "Late_Order_Value": "Late Order Value",
-                    },
-                    inplace=True,
-                )
-                late_requisitioner_summary_pdf["Max Days Late"] = (
-                    late_requisitioner_summary_pdf["Max Days Late"].fillna(0).astype(int)
-                )
-
-                detail_columns = [
-                    "OrderDate",
-                    "RequestDate",
-                    "RecDate",
-                    "PONumber",
-                    "Purchase Account",
-                    "Requisitioner",
-                    "VendorName",
-                    "Total",
-                    "Days Late",
-                ]
-                available_detail_columns = [
-                    col for col in detail_columns if col in late_df.columns
-                ]
-                late_pos_display = late_df[available_detail_columns].copy()
-                for col in ["OrderDate", "RequestDate", "RecDate"]:
-                    if col in late_pos_display.columns:
-                        late_pos_display[col] = pd.to_datetime(
-                            late_pos_display[col], errors="coerce"
-                        ).dt.date
-                if "Total" in late_pos_display.columns:
-                    late_pos_display.rename(columns={"Total": "Total Amount"}, inplace=True)
-                    late_pos_display["Total Amount"] = late_pos_display["Total Amount"].apply(
-                        format_currency
-                    )
-                late_pos_display.sort_values(by="Days Late", ascending=False, inplace=True)
-                late_pos_display.reset_index(drop=True, inplace=True)
-                late_pos_pdf = late_pos_display.copy()
-
-                if not late_account_summary_pdf.empty:
-                    top_account = late_account_summary_pdf.iloc[0]
-                    delivery_insights.append(
-                        f"Purchase Account {top_account['Purchase Account']} has {int(top_account['Late Orders'])} late orders averaging {top_account['Avg Days Late']:.1f} days late."
-                    )
-                if not late_requisitioner_summary_pdf.empty:
-                    top_req = late_requisitioner_summary_pdf.iloc[0]
-                    delivery_insights.append(
-                        f"{top_req['Requisitioner']} has {int(top_req['Late Orders'])} late orders with up to {int(top_req['Max Days Late'])} days delay."
-                    )
-        else:
-            delivery_message = "No delivery performance data is available after removing rows with missing dates."
-    else:
-        delivery_message = "'RecDate' and/or 'RequestDate' columns are missing."
-
-    if selected_requisitioner != "All":
-        delivery_insights.append(
-            f"Delivery metrics are scoped to requisitioner {selected_requisitioner}."
-        )
-
-    matrix_df = otd_matrix_by_account(df_filtered)
-
-    account_value_summary_pdf = pd.DataFrame()
-    if "Purchase Account" in df_filtered.columns:
-        account_group = df_filtered.groupby("Purchase Account")
-        account_value_summary_pdf = account_group["PONumber"].nunique().rename("Unique POs").to_frame()
-        account_value_summary_pdf["Order Lines"] = account_group.size()
-        account_value_summary_pdf["Total Value"] = account_group["Total"].sum()
-        if "Amt" in df_filtered.columns:
-            account_value_summary_pdf["Open Amount"] = account_group["Amt"].sum()
-        else:
-            account_value_summary_pdf["Open Amount"] = 0.0
-        account_value_summary_pdf["Avg Order Value"] = (
-            account_value_summary_pdf["Total Value"]
-            / account_value_summary_pdf["Unique POs"].replace(0, pd.NA)
-        )
-        account_value_summary_pdf["Avg Order Value"] = account_value_summary_pdf["Avg Order Value"].fillna(0.0)
-        account_value_summary_pdf.reset_index(inplace=True)
-        account_value_summary_pdf.sort_values(by="Total Value", ascending=False, inplace=True)
-        account_value_summary_pdf["Unique POs"] = account_value_summary_pdf["Unique POs"].astype(int)
-        account_value_summary_pdf["Order Lines"] = account_value_summary_pdf["Order Lines"].astype(int)
-
-    requisitioner_summary_pdf = pd.DataFrame()
-    if "Requisitioner" in df_filtered.columns:
-        req_group = df_filtered.groupby("Requisitioner")
-        requisitioner_summary_pdf = req_group["PONumber"].nunique().rename("Unique POs").to_frame()
-        requisitioner_summary_pdf["Order Lines"] = req_group.size()
-        requisitioner_summary_pdf["Total Value"] = req_group["Total"].sum()
-        if "Amt" in df_filtered.columns:
-            requisitioner_summary_pdf["Open Amount"] = req_group["Amt"].sum()
-        else:
-            requisitioner_summary_pdf["Open Amount"] = 0.0
-        requisitioner_summary_pdf["Avg Order Value"] = (
-            requisitioner_summary_pdf["Total Value"]
-            / requisitioner_summary_pdf["Unique POs"].replace(0, pd.NA)
-        )
-        requisitioner_summary_pdf["Avg Order Value"] = requisitioner_summary_pdf["Avg Order Value"].fillna(0.0)
-
-        if not late_requisitioner_summary_pdf.empty:
-            late_req_join = late_requisitioner_summary_pdf.set_index("Requisitioner")[
-                ["Late Orders", "Late Lines", "Avg Days Late", "Max Days Late", "Late Order Value"]
-            ]
-            requisitioner_summary_pdf = requisitioner_summary_pdf.join(late_req_join, how="left")
-        else:
-            requisitioner_summary_pdf["Late Orders"] = 0
-            requisitioner_summary_pdf["Late Lines"] = 0
-            requisitioner_summary_pdf["Avg Days Late"] = 0.0
-            requisitioner_summary_pdf["Max Days Late"] = 0.0
-            requisitioner_summary_pdf["Late Order Value"] = 0.0
-
-        requisitioner_summary_pdf.fillna(
-            {
-                "Late Orders": 0,
-                "Late Lines": 0,
-                "Avg Days Late": 0.0,
-                "Max Days Late": 0.0,
-                "Late Order Value": 0.0,
-            },
-            inplace=True,
-        )
-        requisitioner_summary_pdf.reset_index(inplace=True)
-        requisitioner_summary_pdf.sort_values(by="Total Value", ascending=False, inplace=True)
-        requisitioner_summary_pdf["Late Orders"] = requisitioner_summary_pdf["Late Orders"].astype(int)
-        requisitioner_summary_pdf["Late Lines"] = requisitioner_summary_pdf["Late Lines"].astype(int)
-        requisitioner_summary_pdf["Avg Days Late"] = requisitioner_summary_pdf["Avg Days Late"].round(1)
-        requisitioner_summary_pdf["Max Days Late"] = requisitioner_summary_pdf["Max Days Late"].round(0)
-        requisitioner_summary_pdf["Unique POs"] = requisitioner_summary_pdf["Unique POs"].astype(int)
-        requisitioner_summary_pdf["Order Lines"] = requisitioner_summary_pdf["Order Lines"].astype(int)
-
-    if delivery_ready and not delivery_summary_pdf.empty:
-        pdf_sections.append(("On-Time Delivery Summary", delivery_summary_pdf.copy(), None))
-    if not matrix_df.empty:
-        pdf_sections.append(("On-Time Delivery by Purchase Account", matrix_df.copy(), None))
-    if not account_value_summary_pdf.empty:
-        pdf_sections.append(("Purchase Account Value Summary", account_value_summary_pdf.copy(), None))
-    if not requisitioner_summary_pdf.empty:
-        pdf_sections.append(("Requisitioner Value Summary", requisitioner_summary_pdf.copy(), None))
-    if not late_account_summary_pdf.empty:
-        pdf_sections.append(("Late Orders by Purchase Account", late_account_summary_pdf.copy(), None))
-    if not late_requisitioner_summary_pdf.empty:
-        pdf_sections.append(("Late Orders by Requisitioner", late_requisitioner_summary_pdf.copy(), None))
-    if not late_pos_pdf.empty:
-        pdf_sections.append(("Detailed Late Orders", late_pos_pdf.copy(), None))
-
-    delivery_tab, accounts_tab, requisitioner_tab = st.tabs(
-        ["Delivery Health", "Purchase Accounts", "Requisitioners"]
+    active_tab = st.radio(
+        "Dashboard view",
+        list(DASHBOARD_TABS),
+        horizontal=True,
+        key="dashboard_tab",
+        label_visibility="collapsed",
     )
-
-    with delivery_tab:
+    tab_tables = load_sections(DASHBOARD_TABS[active_tab])
+
+    if active_tab == "Delivery Health":
+        delivery = tab_tables["delivery"]
+        delivery_ready = delivery["ready"]
+        on_time_percentage = delivery["on_time_percentage"]
+        late_percentage = delivery["late_percentage"]
+        delivery_summary_display = tab_tables["delivery_summary_display"]
+        late_orders = tab_tables["late_orders"]
         st.subheader("Delivery Health Overview")
         if delivery_ready:
             progress_html = f"""
@@ -1182,20 +1600,70 @@ def main():
             if not delivery_summary_display.empty:
                 st.dataframe(delivery_summary_display.set_index("Metric"), use_container_width=True)
         else:
-            st.info(delivery_message)
+            st.info(delivery["message"])
 
-        if not late_pos_display.empty:
+        if not late_orders.empty:
             st.markdown("#### Late orders detail")
-            st.dataframe(late_pos_display, use_container_width=True)
 
-        if delivery_insights:
+            def first_late_page() -> None:
+                st.session_state["late_orders_page"] = 1
+
+            search_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+            late_search = search_col.text_input(
+                "Search late orders",
+                key="late_orders_search",
+                placeholder="PO, account, requisitioner or vendor",
+                on_change=first_late_page,
+            )
+            late_sort = sort_col.selectbox(
+                "Sort by",
+                list(late_orders.columns),
+                index=list(late_orders.columns).index("Days Late"),
+                key="late_orders_sort",
+                on_change=first_late_page,
+            )
+            late_descending = order_col.selectbox(
+                "Order", ["Descending", "Ascending"], key="late_orders_order", on_change=first_late_page
+            ) == "Descending"
+            late_page_size = size_col.selectbox(
+                "Rows", LATE_ORDER_PAGE_SIZES, key="late_orders_page_size", on_change=first_late_page
+            )
+            late_positions = late_order_positions(
+                get_late_order_index(dashboard.key, late_orders), late_search, late_sort, late_descending
+            )
+            late_pages = late_order_page_count(len(late_positions), late_page_size)
+            if st.session_state.get("late_orders_page", 1) > late_pages:
+                st.session_state["late_orders_page"] = late_pages
+            late_page = st.number_input(
+                f"Page (of {late_pages:,})", min_value=1, max_value=late_pages, step=1, key="late_orders_page"
+            )
+            page_positions, page_start = late_order_page(late_positions, late_page, late_page_size)
+            if len(page_positions):
+                late_page_rows = late_orders.take(page_positions)
+                st.dataframe(
+                    display_frame(late_page_rows),
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config=display_column_config(late_page_rows),
+                )
+                st.caption(
+                    f"Showing {page_start + 1:,}–{page_start + len(page_positions):,} of {len(late_positions):,} "
+                    f"matching late lines ({len(late_orders):,} in total)."
+                )
+            else:
+                st.info("No late orders match the search.")
+
+        if delivery["insights"]:
             st.markdown("#### Quick Insights")
             insights_html = " ".join(
-                [f"<span class='insight-pill'>💡 {insight}</span>" for insight in delivery_insights]
+                [f"<span class='insight-pill'>💡 {insight}</span>" for insight in delivery["insights"]]
             )
             st.markdown(insights_html, unsafe_allow_html=True)
 
-    with accounts_tab:
+    elif active_tab == "Purchase Accounts":
+        matrix_df = tab_tables["otd_matrix"]
+        account_value_summary_pdf = tab_tables["account_value"]
+        late_account_summary_pdf = tab_tables["late_account"]
         st.subheader("Purchase Accounts Overview")
         if not matrix_df.empty:
             matrix_display = matrix_df.copy()
@@ -1203,40 +1671,65 @@ def main():
             matrix_display["Late"] = matrix_display["Late"].astype(int)
             st.dataframe(matrix_display, use_container_width=True)
         if not account_value_summary_pdf.empty:
-            account_display = account_value_summary_pdf.copy()
-            for col in ["Total Value", "Open Amount", "Avg Order Value"]:
-                if col in account_display.columns:
-                    account_display[col] = account_display[col].apply(format_currency)
             st.markdown("#### Spend by purchase account")
-            st.dataframe(account_display, use_container_width=True)
+            st.dataframe(
+                display_frame(account_value_summary_pdf),
+                use_container_width=True,
+                column_config=display_column_config(account_value_summary_pdf),
+            )
         if not late_account_summary_pdf.empty:
-            late_account_display = late_account_summary_pdf.copy()
-            if "Late Order Value" in late_account_display.columns:
-                late_account_display["Late Order Value"] = late_account_display["Late Order Value"].apply(
-                    format_currency
-                )
             st.markdown("#### Late orders by purchase account")
-            st.dataframe(late_account_display, use_container_width=True)
+            st.dataframe(
+                display_frame(late_account_summary_pdf),
+                use_container_width=True,
+                column_config=display_column_config(late_account_summary_pdf),
+            )
 
-    with requisitioner_tab:
+    elif active_tab == "Requisitioners":
+        requisitioner_summary_pdf = tab_tables["requisitioner_value"]
+        late_requisitioner_summary_pdf = tab_tables["late_requisitioner"]
         st.subheader("Requisitioner Overview")
         if not requisitioner_summary_pdf.empty:
-            requisitioner_display = requisitioner_summary_pdf.copy()
-            for col in ["Total Value", "Open Amount", "Avg Order Value", "Late Order Value"]:
-                if col in requisitioner_display.columns:
-                    requisitioner_display[col] = requisitioner_display[col].apply(format_currency)
-            st.dataframe(requisitioner_display, use_container_width=True)
+            st.dataframe(
+                display_frame(requisitioner_summary_pdf),
+                use_container_width=True,
+                column_config=display_column_config(requisitioner_summary_pdf),
+            )
         if not late_requisitioner_summary_pdf.empty:
-            late_req_display = late_requisitioner_summary_pdf.copy()
-            if "Late Order Value" in late_req_display.columns:
-                late_req_display["Late Order Value"] = late_req_display["Late Order Value"].apply(format_currency)
             st.markdown("#### Late orders by requisitioner")
-            st.dataframe(late_req_display, use_container_width=True)
+            st.dataframe(
+                display_frame(late_requisitioner_summary_pdf),
+                use_container_width=True,
+                column_config=display_column_config(late_requisitioner_summary_pdf),
+            )
+
+    elif active_tab == "Lead Times":
+        lead_time_summary = tab_tables["lead_time_summary"]
+        lead_time_by_vendor = tab_tables["lead_time_by_vendor"]
+        lead_time_trend = tab_tables["lead_time_trend"]
+        st.subheader("Vendor Lead Times")
+        if lead_time_summary.empty:
+            st.info("Lead times need received dates (RecDate) alongside order dates.")
+        else:
+            st.caption(
+                "Lead Time is days from order to receipt; Days vs Request is days received after the requested "
+                "date (negative means early). Percentiles are nearest-rank over whole days."
+            )
+            st.dataframe(lead_time_summary, use_container_width=True, hide_index=True)
+            if not lead_time_trend.empty:
+                st.plotly_chart(cached_chart("lead_time_trend", lead_time_trend), use_container_width=True)
+            if not lead_time_by_vendor.empty:
+                st.markdown("#### Lead times by vendor")
+                st.dataframe(lead_time_by_vendor, use_container_width=True, hide_index=True)
 
     processing_end_time = time.time()
     total_processing_time = processing_end_time - processing_start_time
+    cache_stats = filter_cache.stats()
     st.markdown(
-        f"<div class='processing-time'>Processed in {total_processing_time:.2f} seconds.</div>",
+        f"<div class='processing-time'>Processed in {total_processing_time:.2f} seconds · "
+        f"filter cache {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses "
+        f"({cache_stats['bytes'] / 1_048_576:,.1f} MB) · "
+        f"{'aggregates from the monthly cube' if dashboard.source == 'cube' else 'aggregates from a row scan'}</div>",
         unsafe_allow_html=True,
     )
 
@@ -1319,6 +1812,9 @@ def main():
             elements.append(Paragraph(subtitle, normal_style))
             elements.append(Spacer(1, 18))
 
+            pdf_sections.extend(
+                tab_pdf_sections(load_sections(list(dict.fromkeys(sum(DASHBOARD_TABS.values(), ())))))
+            )
             toc_items = ["Key Performance Indicators"] + [title for title, _, _ in pdf_sections]
             elements.append(Paragraph("Table of Contents", subheading_style))
             for idx, item in enumerate(toc_items, 1):
@@ -1342,7 +1838,9 @@ def main():
                 elements.append(Spacer(1, 6))
             elements.append(Spacer(1, 12))
 
-            for title_text, data, _ in pdf_sections:
+            for title_text, data, formatter in pdf_sections:
+                if formatter is not None:
+                    data = formatter(data)
                 data_for_pdf = data.copy() if isinstance(data, pd.DataFrame) else data
                 elements.append(Paragraph(title_text, subheading_style))
                 elements.append(Spacer(1, 8))
@@ -1397,4 +1895,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if "--purge-cache" in sys.argv[1:]:
+        purged = purge_parsed_cache()
+        print(f"Removed {purged} cached source file(s) from {PARSED_CACHE_DIR}.")
+    else:
+        main()
@@ -0,0 +1,1527 @@
+# engine.py
+#
+# Filtering and aggregation behind the dashboard, kept free of Streamlit and
+# Plotly so results can be computed headlessly (tests, batch jobs). app.py
+# wraps the per-dataset builders here in its own caches and passes them in.
+
+
+# Standard library imports
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields, is_dataclass
+from datetime import date, datetime
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Third-party imports
+import numpy as np
+import pandas as pd
+
+
+def dataset_digest(df: pd.DataFrame) -> str:
+    """Return a content hash identifying a processed dataset."""
+    digest = hashlib.sha256("|".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def build_facet_catalog(index: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize a filter index into sidebar options, ranges and row counts."""
+    catalog: Dict[str, Any] = {"ranges": {}, "facets": {}}
+    for col, (keys, _) in index["ranges"].items():
+        if not len(keys):
+            continue
+        low, high = keys[0], keys[-1]
+        if keys.dtype.kind == "i":
+            low, high = pd.Timestamp(low), pd.Timestamp(high)
+        catalog["ranges"][col] = (low, high)
+    for col, (categories, codes) in index["facets"].items():
+        counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+        present = np.flatnonzero(counts)
+        values = categories[present].tolist()
+        catalog["facets"][col] = {
+            "values": sorted(values),
+            "counts": dict(zip(values, counts[present].tolist())),
+        }
+    return catalog
+
+
+def live_facet_counts(index: Dict[str, Any], filters: Dict[str, Any]) -> Dict[str, pd.Series]:
+    """Count rows per facet value under every active filter except the facet's own.
+
+    This is the usual faceted-search count: the numbers next to each vendor
+    reflect the date, account, status and amount filters, but not the vendor
+    selection itself. Only the precomputed masks and codes are touched.
+    Counts are Series indexed by the facet's categories.
+    """
+    masks = filter_masks(index, filters)
+    counts: Dict[str, pd.Series] = {}
+    for name, col in FACET_INDEX_COLUMNS.items():
+        if col not in index["facets"]:
+            continue
+        categories, codes = index["facets"][col]
+        others = [mask for key, mask in masks.items() if key != name]
+        selected = codes[np.logical_and.reduce(others)] if others else codes
+        tally = np.bincount(selected[selected >= 0], minlength=len(categories))
+        counts[col] = pd.Series(tally, index=categories)
+    return counts
+
+
+def cached_facet_counts(
+    cache: "FilterResultCache", digest: str, index: Dict[str, Any], filters: Dict[str, Any]
+) -> Dict[str, pd.Series]:
+    """Return ``live_facet_counts``, reused from ``cache`` when this filter state was already counted.
+
+    A rerun that leaves the filters alone then skips the per-facet scan over
+    every row.
+    """
+    key = (dashboard_key(digest, filters), "facet_counts")
+    counts = cache.get(key)
+    if counts is None:
+        counts = live_facet_counts(index, filters)
+        cache.put(key, counts)
+    return counts
+
+
+# Columns with a sorted position index for range filters
+RANGE_INDEX_COLUMNS = ["OrderDate", "RequestDate", "Total"]
+# Categorical columns filtered by membership, keyed by their filter name
+FACET_INDEX_COLUMNS = {
+    "purchase_account": "Purchase Account",
+    "requisitioner": "Requisitioner",
+    "vendors": "VendorName",
+    "statuses": "POStatus",
+}
+
+
+def build_filter_index(df: pd.DataFrame) -> Dict[str, Any]:
+    """Precompute the lookups ``apply_filters`` needs for ``df``.
+
+    Range columns are stored as sorted keys with the row positions they came
+    from, so a range becomes two ``searchsorted`` calls. Facet columns keep
+    their categorical codes; a selection becomes a boolean lookup table over
+    the categories indexed by those codes. Row positions refer to ``df`` as
+    returned by ``load_and_process_data`` (a default RangeIndex).
+    """
+    index: Dict[str, Any] = {"rows": len(df), "ranges": {}, "facets": {}}
+    for col in RANGE_INDEX_COLUMNS:
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            present = series.notna().to_numpy()
+            # Keys are nanoseconds since the epoch, whatever unit the column arrived in
+            keys = series.dt.as_unit("ns").to_numpy().view("i8")
+        else:
+            keys = pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64")
+            present = ~np.isnan(keys)
+        positions = np.flatnonzero(present)
+        order = positions[np.argsort(keys[positions], kind="stable")]
+        index["ranges"][col] = (keys[order], order)
+    for col in FACET_INDEX_COLUMNS.values():
+        if col in df.columns:
+            values = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype("category")
+            index["facets"][col] = (values.cat.categories, values.cat.codes.to_numpy())
+    return index
+
+
+def _range_bounds(index: Dict[str, Any], col: str, low: Any, high: Any) -> Tuple[int, int]:
+    """Return the slice of ``col``'s sorted keys that falls within ``[low, high]``."""
+    keys, _ = index["ranges"][col]
+    if keys.dtype.kind == "i":
+        low, high = pd.Timestamp(low).value, pd.Timestamp(high).value
+    return int(np.searchsorted(keys, low, side="left")), int(np.searchsorted(keys, high, side="right"))
+
+
+def _range_mask(index: Dict[str, Any], col: str, low: Any, high: Any) -> np.ndarray:
+    start, stop = _range_bounds(index, col, low, high)
+    mask = np.zeros(index["rows"], dtype=bool)
+    mask[index["ranges"][col][1][start:stop]] = True
+    return mask
+
+
+def _facet_lookup(index: Dict[str, Any], col: str, selected: Sequence[Any]) -> np.ndarray:
+    categories, _ = index["facets"][col]
+    # One extra slot so the missing-value code (-1) always looks up False
+    lookup = np.zeros(len(categories) + 1, dtype=bool)
+    selected_codes = categories.get_indexer(list(selected))
+    lookup[selected_codes[selected_codes >= 0]] = True
+    return lookup
+
+
+def _facet_mask(index: Dict[str, Any], col: str, selected: Sequence[Any]) -> np.ndarray:
+    return _facet_lookup(index, col, selected)[index["facets"][col][1]]
+
+
+def _facet_selections(filters: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """Return the active facet selections as lists, keyed by filter name."""
+    selections: Dict[str, List[Any]] = {}
+    for name in FACET_INDEX_COLUMNS:
+        selection = filters.get(name)
+        if not selection or selection == "All":
+            continue
+        selections[name] = [selection] if isinstance(selection, str) else list(selection)
+    return selections
+
+
+def filter_masks(index: Dict[str, Any], filters: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Return one boolean row mask per active filter, keyed by filter name."""
+    masks: Dict[str, np.ndarray] = {}
+    order_start, order_end = filters["order_date_range"]
+    masks["order_date_range"] = _range_mask(index, "OrderDate", order_start, order_end)
+
+    request_range = filters.get("request_date_range")
+    if request_range and "RequestDate" in index["ranges"]:
+        masks["request_date_range"] = _range_mask(index, "RequestDate", *request_range)
+
+    for name, selection in _facet_selections(filters).items():
+        col = FACET_INDEX_COLUMNS[name]
+        if col in index["facets"]:
+            masks[name] = _facet_mask(index, col, selection)
+
+    total_min, total_max = filters.get("total_range", (None, None))
+    if total_min is not None and total_max is not None and "Total" in index["ranges"]:
+        masks["total_range"] = _range_mask(index, "Total", total_min, total_max)
+    return masks
+
+
+def apply_filters(
+    df: pd.DataFrame, filters: Dict[str, Any], index: Optional[Dict[str, Any]] = None
+) -> pd.DataFrame:
+    """Return the rows of ``df`` matching ``filters`` with a single ``take``."""
+    if index is None:
+        index = build_filter_index(df)
+    return df.take(np.flatnonzero(filter_row_mask(index, filters)))
+
+
+def filter_row_mask(index: Dict[str, Any], filters: Dict[str, Any]) -> np.ndarray:
+    """Return the boolean mask of the indexed rows matching every filter."""
+    return np.logical_and.reduce(list(filter_masks(index, filters).values()))
+
+
+# Upper bound on memory held by cached filter results
+FILTER_CACHE_MAX_BYTES = int(os.environ.get("TTU_FILTER_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+def canonical_filters(filters: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """Return a hashable form of ``filters`` that ignores selection order."""
+
+    def canonical(value: Any) -> Any:
+        if isinstance(value, (date, datetime, pd.Timestamp)):
+            return value.isoformat()
+        if isinstance(value, list):
+            return tuple(sorted(str(item) for item in value))
+        if isinstance(value, tuple):
+            return tuple(canonical(item) for item in value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return value
+
+    return tuple(sorted((key, canonical(value)) for key, value in filters.items()))
+
+
+def _result_nbytes(value: Any) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, dict):
+        return sum(_result_nbytes(item) for item in value.values())
+    if is_dataclass(value):
+        return sum(_result_nbytes(getattr(value, field.name)) for field in fields(value))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, str):
+        return len(value)
+    return 0
+
+
+class FilterResultCache:
+    """LRU cache of filter results, bounded by the bytes of the cached frames.
+
+    Entries are shared between sessions, so cached frames must be treated as
+    read-only by callers.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Any, value: Any) -> None:
+        nbytes = _result_nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes_used -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes_used += nbytes
+            while self.bytes_used > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.bytes_used -= evicted_bytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.bytes_used,
+            }
+
+
+# HyperLogLog precision for approximate distinct counts: 2**p one-byte registers per sketch
+HLL_PRECISION = int(os.environ.get("TTU_HLL_PRECISION", "12"))
+
+
+def hll_relative_error(precision: int = HLL_PRECISION) -> float:
+    """Return the standard error of a HyperLogLog estimate at ``precision``."""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    length = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >> np.uint64(shift)
+        wide = high > 0
+        length[wide] += shift
+        values = np.where(wide, high, values)
+    return length + (values > 0)
+
+
+def hll_entries(values: pd.Series, precision: int = HLL_PRECISION) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash each of ``values`` into a HyperLogLog ``(register, rank)``; missing values get register -1."""
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    tail_bits = 64 - precision
+    registers = (hashes >> np.uint64(tail_bits)).astype(np.int32)
+    registers[values.isna().to_numpy()] = -1
+    tails = hashes & np.uint64((1 << tail_bits) - 1)
+    ranks = (tail_bits + 1 - _bit_length(tails)).astype(np.uint8)
+    return registers, ranks
+
+
+def hll_merge(
+    keys: np.ndarray, registers: np.ndarray, ranks: np.ndarray, key_count: int, precision: int = HLL_PRECISION
+) -> np.ndarray:
+    """Fold entries into one dense sketch per key (-1 skips); sketches merge by element-wise max."""
+    size = 1 << precision
+    sketches = np.zeros(key_count * size, dtype=np.uint8)
+    valid = keys >= 0
+    np.maximum.at(sketches, keys[valid].astype(np.int64) * size + registers[valid], ranks[valid])
+    return sketches.reshape(key_count, size)
+
+
+def hll_estimate(sketches: np.ndarray) -> np.ndarray:
+    """Return the estimated distinct count for each sketch row, using linear counting when small."""
+    size = sketches.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / size)
+    raw = alpha * size * size / np.power(2.0, -sketches.astype(np.float64)).sum(axis=1)
+    empty = (sketches == 0).sum(axis=1)
+    small = (raw <= 2.5 * size) & (empty > 0)
+    raw[small] = size * np.log(size / empty[small])
+    return np.rint(raw).astype(np.int64)
+
+
+def approx_distinct(
+    values: pd.Series,
+    row_entries: Tuple[np.ndarray, np.ndarray],
+    keys: Optional[np.ndarray] = None,
+    key_count: int = 1,
+) -> np.ndarray:
+    """Estimate distinct non-missing ``values`` per key (row codes, -1 skips).
+
+    ``row_entries`` are the dataset's per-row ``hll_entries`` for the column,
+    looked up by the row labels ``values`` kept from the processed frame, so
+    nothing is rehashed per query.
+    """
+    present = values.notna().to_numpy()
+    registers, ranks = (entries[values.index.to_numpy()[present]] for entries in row_entries)
+    row_keys = np.zeros(len(registers), dtype=np.int64) if keys is None else np.asarray(keys)[present]
+    return hll_estimate(hll_merge(np.where(registers >= 0, row_keys, -1), registers, ranks, key_count))
+
+
+def compute_spend_summaries(
+    df_filtered: pd.DataFrame, po_sketch: Optional[Tuple[np.ndarray, np.ndarray]] = None
+) -> Dict[str, pd.DataFrame]:
+    """Return the monthly spend trend and the top-10 vendors by spend.
+
+    With ``po_sketch`` (per-row PONumber ``hll_entries``) distinct POs are estimated.
+    """
+    trend_summary = pd.DataFrame()
+    vendor_summary = pd.DataFrame()
+
+    if {"OrderDate", "Total"}.issubset(df_filtered.columns):
+        # Group on the month key itself; rows without a date fall out of the
+        # groupby, so the filtered frame is neither copied nor sliced
+        months = df_filtered["OrderDate"].dt.to_period("M").dt.to_timestamp().rename("Order Month")
+        if months.notna().any():
+            agg_dict = {"total_spend": ("Total", "sum")}
+            if "PONumber" not in df_filtered.columns:
+                agg_dict["unique_pos"] = ("Total", "size")
+            elif po_sketch is None:
+                agg_dict["unique_pos"] = ("PONumber", "nunique")
+            trend_summary = df_filtered.groupby(months).agg(**agg_dict)
+            if "unique_pos" not in trend_summary.columns:
+                month_keys = trend_summary.index.get_indexer(months)
+                trend_summary["unique_pos"] = approx_distinct(
+                    df_filtered["PONumber"], po_sketch, month_keys, len(trend_summary)
+                )
+            trend_summary = trend_summary.reset_index()
+            trend_summary.rename(
+                columns={"total_spend": "Total Spend", "unique_pos": "Unique POs"}, inplace=True
+            )
+
+    if {"VendorName", "Total"}.issubset(df_filtered.columns):
+        vendor_summary = (
+            df_filtered.groupby("VendorName", observed=True)["Total"].sum().reset_index().sort_values("Total", ascending=False)
+        )
+        vendor_summary = vendor_summary.head(10)
+
+    return {"trend_summary": trend_summary, "vendor_summary": vendor_summary}
+
+
+# Dimensions with their own value and late-order tables
+DIMENSION_TABLE_COLUMNS = ["Purchase Account", "Requisitioner"]
+LATE_SUMMARY_COLUMNS = {
+    "Late_Orders": "Late Orders",
+    "Late_Lines": "Late Lines",
+    "Avg_Days_Late": "Avg Days Late",
+    "Max_Days_Late": "Max Days Late",
+    "Late_Order_Value": "Late Order Value",
+}
+
+
+def _dimension_measures(
+    df: pd.DataFrame, approximate: bool = False
+) -> Tuple[pd.DataFrame, Dict[str, Tuple[str, str]]]:
+    """Return the per-row measures and named aggregations shared by every dimension.
+
+    Late measures are masked to NaN outside late rows (both dates present and
+    received after the request date), so ``nunique``, ``mean`` and ``max``
+    skip them exactly as if the late rows had been sliced out first. With
+    ``approximate`` the distinct-PO aggregations are left to the caller.
+    """
+    measures = {"PONumber": df["PONumber"], "Total": df["Total"]}
+    named = {
+        "Unique_POs": ("PONumber", "nunique"),
+        "Order_Lines": ("PONumber", "size"),
+        "Total_Value": ("Total", "sum"),
+    }
+    if "Amt" in df.columns:
+        measures["Amt"] = df["Amt"]
+        named["Open_Amount"] = ("Amt", "sum")
+    if {"RecDate", "RequestDate"}.issubset(df.columns):
+        # NaT compares False both ways: such rows are neither on time nor late here
+        on_time = df["RecDate"] <= df["RequestDate"]
+        late = df["RecDate"] > df["RequestDate"]
+        measures["On_Time"] = on_time
+        measures["Late_Line"] = late
+        measures["Late_PO"] = df["PONumber"].where(late)
+        measures["Days_Late"] = (df["RecDate"] - df["RequestDate"]).dt.days.where(late)
+        measures["Late_Value"] = df["Total"].where(late)
+        named.update(
+            On_Time=("On_Time", "sum"),
+            Late_Orders=("Late_PO", "nunique"),
+            Late_Lines=("Late_Line", "sum"),
+            Avg_Days_Late=("Days_Late", "mean"),
+            Max_Days_Late=("Days_Late", "max"),
+            Late_Order_Value=("Late_Value", "sum"),
+        )
+    if approximate:
+        named = {name: spec for name, spec in named.items() if spec[1] != "nunique"}
+    return pd.DataFrame(measures, index=df.index), named
+
+
+def _value_table(grouped: pd.DataFrame) -> pd.DataFrame:
+    table = grouped[["Unique_POs", "Order_Lines", "Total_Value"]].rename(
+        columns={"Unique_POs": "Unique POs", "Order_Lines": "Order Lines", "Total_Value": "Total Value"}
+    )
+    table["Open Amount"] = grouped["Open_Amount"] if "Open_Amount" in grouped.columns else 0.0
+    table["Avg Order Value"] = table["Total Value"] / table["Unique POs"].replace(0, pd.NA)
+    table["Avg Order Value"] = table["Avg Order Value"].fillna(0.0)
+    return table
+
+
+def _late_table(grouped: pd.DataFrame) -> pd.DataFrame:
+    late = grouped.loc[grouped["Late_Lines"] > 0, list(LATE_SUMMARY_COLUMNS)].reset_index()
+    late.sort_values(by=["Late_Orders", "Late_Order_Value"], ascending=False, inplace=True)
+    late["Avg_Days_Late"] = late["Avg_Days_Late"].round(1)
+    late.rename(columns=LATE_SUMMARY_COLUMNS, inplace=True)
+    late["Max Days Late"] = late["Max Days Late"].fillna(0).astype(int)
+    return late
+
+
+def aggregate_dimension_tables(
+    df_filtered: pd.DataFrame,
+    po_sketch: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    dimensions: Sequence[str] = DIMENSION_TABLE_COLUMNS,
+) -> Dict[str, pd.DataFrame]:
+    """Build every per-account and per-requisitioner table from one groupby each.
+
+    The row measures are derived once and each dimension is grouped a single
+    time; the on-time matrix, value summaries and late-order summaries are all
+    sliced from that one aggregate. Missing inputs yield empty frames. With
+    ``po_sketch`` the distinct-PO columns are HyperLogLog estimates.
+    """
+    dimensions = [col for col in dimensions if col in df_filtered.columns]
+    if not dimensions or df_filtered.empty:
+        return _dimension_tables({}, has_dates=False)
+
+    measures, named = _dimension_measures(df_filtered, approximate=po_sketch is not None)
+    groups = {}
+    for dim in dimensions:
+        grouped = measures.groupby(df_filtered[dim], observed=True).agg(**named)
+        grouped.index.name = dim
+        if po_sketch is not None:
+            keys = grouped.index.get_indexer(df_filtered[dim])
+            grouped.insert(0, "Unique_POs", approx_distinct(measures["PONumber"], po_sketch, keys, len(grouped)))
+            if "Late_PO" in measures.columns:
+                grouped["Late_Orders"] = approx_distinct(measures["Late_PO"], po_sketch, keys, len(grouped))
+        groups[dim] = grouped
+    return _dimension_tables(groups, has_dates="On_Time" in measures.columns)
+
+
+def _dimension_tables(groups: Dict[str, pd.DataFrame], has_dates: bool) -> Dict[str, pd.DataFrame]:
+    """Shape per-dimension aggregates into the account and requisitioner tables."""
+    tables = {
+        name: pd.DataFrame()
+        for name in ("otd_matrix", "account_value", "late_account", "requisitioner_value", "late_requisitioner")
+    }
+    for dim, grouped in groups.items():
+        value = _value_table(grouped)
+        late = _late_table(grouped) if has_dates and grouped["Late_Lines"].any() else pd.DataFrame()
+
+        if dim == "Purchase Account":
+            if has_dates:
+                matrix = grouped[["On_Time"]].copy()
+                matrix["Late"] = grouped["Order_Lines"] - grouped["On_Time"]
+                matrix = matrix.reset_index()
+                matrix["On-Time %"] = (matrix["On_Time"] / (matrix["On_Time"] + matrix["Late"]) * 100).round(2)
+                matrix.rename(columns={"On_Time": "On-Time"}, inplace=True)
+                tables["otd_matrix"] = matrix
+            value.reset_index(inplace=True)
+            value.sort_values(by="Total Value", ascending=False, inplace=True)
+            value["Unique POs"] = value["Unique POs"].astype(int)
+            value["Order Lines"] = value["Order Lines"].astype(int)
+            tables["account_value"] = value
+            tables["late_account"] = late
+            continue
+
+        if not late.empty:
+            value = value.join(late.set_index(dim)[list(LATE_SUMMARY_COLUMNS.values())], how="left")
+        else:
+            value["Late Orders"] = 0
+            value["Late Lines"] = 0
+            value["Avg Days Late"] = 0.0
+            value["Max Days Late"] = 0.0
+            value["Late Order Value"] = 0.0
+        value.fillna(
+            {
+                "Late Orders": 0,
+                "Late Lines": 0,
+                "Avg Days Late": 0.0,
+                "Max Days Late": 0.0,
+                "Late Order Value": 0.0,
+            },
+            inplace=True,
+        )
+        value.reset_index(inplace=True)
+        value.sort_values(by="Total Value", ascending=False, inplace=True)
+        value["Late Orders"] = value["Late Orders"].astype(int)
+        value["Late Lines"] = value["Late Lines"].astype(int)
+        value["Avg Days Late"] = value["Avg Days Late"].round(1)
+        value["Max Days Late"] = value["Max Days Late"].round(0)
+        value["Unique POs"] = value["Unique POs"].astype(int)
+        value["Order Lines"] = value["Order Lines"].astype(int)
+        tables["requisitioner_value"] = value
+        tables["late_requisitioner"] = late
+    return tables
+
+
+def compute_kpis(
+    df_filtered: pd.DataFrame, po_sketch: Optional[Tuple[np.ndarray, np.ndarray]] = None
+) -> Dict[str, Any]:
+    """Return the headline counts and amounts shown on the index cards."""
+    kpis: Dict[str, Any] = {
+        "line_items": len(df_filtered),
+        "unique_pos": _distinct_pos(df_filtered, po_sketch),
+        "open_amount": 0.0,
+        "max_total_label": None,
+    }
+    if {"Amt", "POStatus"}.issubset(df_filtered.columns):
+        kpis["open_amount"] = df_filtered[df_filtered["POStatus"] == "OPEN"]["Amt"].sum()
+    if "Total" in df_filtered.columns and df_filtered["Total"].notna().any():
+        kpis["max_total_label"] = df_filtered["Total"].idxmax()
+    return kpis
+
+
+def _distinct_pos(df: pd.DataFrame, po_sketch: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> int:
+    """Count distinct POs in ``df`` (rows when there is no PONumber column)."""
+    if "PONumber" not in df.columns:
+        return len(df)
+    if po_sketch is not None:
+        return int(approx_distinct(df["PONumber"], po_sketch)[0])
+    return df["PONumber"].nunique()
+
+
+# Lead-time measures in whole days: label -> (start column, end column)
+LEAD_TIME_METRICS = {"Lead Time": ("OrderDate", "RecDate"), "Days vs Request": ("RequestDate", "RecDate")}
+LEAD_TIME_PERCENTILES = (50, 90, 99)
+
+
+def _lead_time_entries(cell: np.ndarray, df: pd.DataFrame) -> Dict[str, Tuple[np.ndarray, ...]]:
+    """Return each lead-time metric as a sparse day histogram: ``(cell, days, count)`` entries.
+
+    Whole-day histograms are exact quantile sketches for these measures and
+    merge by simply pooling entries, whichever cells a slice selects.
+    """
+    entries = {}
+    for metric, (start_col, end_col) in LEAD_TIME_METRICS.items():
+        if not {start_col, end_col}.issubset(df.columns):
+            continue
+        days = (df[end_col] - df[start_col]).dt.days
+        present = days.notna().to_numpy()
+        counts = (
+            pd.DataFrame({"cell": cell[present], "days": days.to_numpy()[present].astype(np.int64)})
+            .groupby(["cell", "days"])
+            .size()
+        )
+        entries[metric] = (
+            counts.index.get_level_values("cell").to_numpy(),
+            counts.index.get_level_values("days").to_numpy(),
+            counts.to_numpy(),
+        )
+    return entries
+
+
+def histogram_percentiles(
+    keys: np.ndarray, days: np.ndarray, counts: np.ndarray, key_count: int, percentiles: Sequence[int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Merge day histograms per key (-1 skips) and return counts, means and percentiles.
+
+    Percentiles use the nearest-rank definition (the smallest day with at
+    least ``p``% of the lines at or below it), so they are exact. Only the
+    histogram entries are sorted, never the rows behind them.
+    """
+    valid = keys >= 0
+    order = np.lexsort((days[valid], keys[valid]))
+    keys, days, counts = keys[valid][order], days[valid][order], counts[valid][order]
+    totals = np.bincount(keys, weights=counts, minlength=key_count).astype(np.int64)
+    sums = np.bincount(keys, weights=days * counts, minlength=key_count)
+    running = np.cumsum(counts)
+    before = np.cumsum(totals) - totals
+    present = totals > 0
+    values = np.full((key_count, len(percentiles)), np.nan)
+    for column, percentile in enumerate(percentiles):
+        rank = np.maximum((percentile * totals + 99) // 100, 1)
+        position = np.searchsorted(running, before + rank, side="left")
+        values[present, column] = days[position[present]]
+    means = np.full(key_count, np.nan)
+    means[present] = sums[present] / totals[present]
+    return totals, means, values
+
+
+def lead_time_tables(
+    entries: Dict[str, Tuple[np.ndarray, ...]],
+    cell_vendor: Optional[np.ndarray],
+    vendor_labels: Any,
+    cell_month: np.ndarray,
+    months: pd.DatetimeIndex,
+) -> Dict[str, pd.DataFrame]:
+    """Summarize lead-time histograms overall, per vendor and per order month.
+
+    ``entries`` come from ``_lead_time_entries``; ``cell_vendor`` and
+    ``cell_month`` map their cells to vendor and month codes.
+    """
+    tables = {name: pd.DataFrame() for name in ("lead_time_summary", "lead_time_by_vendor", "lead_time_trend")}
+    if not entries:
+        return tables
+    summary_rows = []
+    by_vendor: Dict[str, Any] = {}
+    by_month: Dict[str, Any] = {}
+    for metric, (cells, days, counts) in entries.items():
+        overall = histogram_percentiles(np.zeros(len(cells), dtype=np.int64), days, counts, 1, LEAD_TIME_PERCENTILES)
+        if overall[0][0]:
+            summary_rows.append(
+                {
+                    "Metric": f"{metric} (days)",
+                    "Lines": int(overall[0][0]),
+                    "Mean": round(float(overall[1][0]), 1),
+                    **{f"p{p}": int(overall[2][0, j]) for j, p in enumerate(LEAD_TIME_PERCENTILES)},
+                }
+            )
+        if cell_vendor is not None:
+            by_vendor[metric] = histogram_percentiles(
+                cell_vendor[cells], days, counts, len(vendor_labels), LEAD_TIME_PERCENTILES
+            )
+        by_month[metric] = histogram_percentiles(cell_month[cells], days, counts, len(months), LEAD_TIME_PERCENTILES)
+    if not summary_rows:
+        return tables
+    tables["lead_time_summary"] = pd.DataFrame(summary_rows)
+
+    def percentile_columns(results: Dict[str, Any], rows: np.ndarray, percentiles: Sequence[int]) -> Dict[str, Any]:
+        columns = {}
+        for metric, (_, _, values) in results.items():
+            for j, percentile in enumerate(LEAD_TIME_PERCENTILES):
+                if percentile in percentiles:
+                    columns[f"{metric} p{percentile}"] = pd.array(values[rows, j], dtype="Int64")
+        return columns
+
+    if by_vendor:
+        first = next(iter(by_vendor.values()))[0]
+        rows = np.flatnonzero(first > 0)
+        vendor_table = pd.DataFrame(
+            {
+                "VendorName": vendor_labels[rows],
+                "Received Lines": first[rows],
+                **percentile_columns(by_vendor, rows, LEAD_TIME_PERCENTILES),
+            }
+        )
+        sort_column = f"{next(iter(by_vendor))} p90"
+        tables["lead_time_by_vendor"] = vendor_table.sort_values(
+            by=[sort_column, "Received Lines"], ascending=False, kind="stable"
+        ).reset_index(drop=True)
+    first = next(iter(by_month.values()))[0]
+    rows = np.flatnonzero(first > 0)
+    tables["lead_time_trend"] = pd.DataFrame(
+        {"Order Month": months[rows], **percentile_columns(by_month, rows, (50, 90))}
+    )
+    return tables
+
+
+def compute_lead_time_tables(df_filtered: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Build the lead-time tables for a row slice that the cube cannot answer."""
+    if "OrderDate" not in df_filtered.columns or df_filtered.empty:
+        return lead_time_tables({}, None, None, np.empty(0, dtype=np.int64), pd.DatetimeIndex([]))
+    month_codes, months = pd.factorize(
+        df_filtered["OrderDate"].dt.to_period("M").dt.to_timestamp(), sort=True
+    )
+    keys = {"month": month_codes}
+    vendor_labels = None
+    if "VendorName" in df_filtered.columns:
+        keys["vendor"], vendor_labels = pd.factorize(df_filtered["VendorName"], sort=True)
+    keys = pd.DataFrame(keys)
+    # Pool rows into vendor-month cells first so only their histograms are sorted
+    cell = keys.groupby(list(keys.columns)).ngroup().to_numpy()
+    cell_keys = keys.groupby(cell).first()
+    return lead_time_tables(
+        _lead_time_entries(cell, df_filtered),
+        cell_keys["vendor"].to_numpy() if vendor_labels is not None else None,
+        vendor_labels,
+        cell_keys["month"].to_numpy(),
+        months,
+    )
+
+
+# How each per-cell cube measure rolls up across cells
+CUBE_ROLLUPS = {
+    "Order_Lines": "sum",
+    "Total_Value": "sum",
+    "Open_Amount": "sum",
+    "On_Time": "sum",
+    "Late_Lines": "sum",
+    "Late_Order_Value": "sum",
+    "Days_Late_Sum": "sum",
+    "Max_Days_Late": "max",
+}
+
+
+def build_order_cube(df: pd.DataFrame, index: Dict[str, Any]) -> Dict[str, Any]:
+    """Pre-aggregate ``df`` by order month, facet values and date/amount presence.
+
+    Each cell holds additive measures (lines, spend, open amount, on-time and
+    late counts, days late) and the row label of its largest order. Distinct
+    POs are kept as sorted ``cell * po_count + po`` pairs, so any union of
+    cells, grouped any way, counts its POs exactly. Facet codes are shared
+    with ``index`` so sidebar selections map straight onto cells.
+    """
+    months = df["OrderDate"].dt.to_period("M").dt.to_timestamp()
+    month_codes, month_values = pd.factorize(months, sort=True)
+    keys = {"month": month_codes.astype(np.int32)}
+    for col, (_, codes) in index["facets"].items():
+        keys[col] = codes
+    for col in ("RequestDate", "Total"):
+        if col in index["ranges"]:
+            keys[f"has_{col}"] = df[col].notna().to_numpy()
+    keys = pd.DataFrame(keys, index=df.index)
+    cell = keys.groupby(list(keys.columns), sort=True).ngroup().to_numpy()
+
+    measures, _ = _dimension_measures(df)
+    cell_named = {"Order_Lines": ("PONumber", "size"), "Total_Value": ("Total", "sum")}
+    if "Amt" in measures.columns:
+        cell_named["Open_Amount"] = ("Amt", "sum")
+    has_dates = "On_Time" in measures.columns
+    if has_dates:
+        cell_named.update(
+            On_Time=("On_Time", "sum"),
+            Late_Lines=("Late_Line", "sum"),
+            Late_Order_Value=("Late_Value", "sum"),
+            Days_Late_Sum=("Days_Late", "sum"),
+            Max_Days_Late=("Days_Late", "max"),
+        )
+    cells = pd.concat([keys.groupby(cell).first(), measures.groupby(cell).agg(**cell_named)], axis=1)
+
+    # Largest order per cell: stable sort by cell then descending total keeps the first row on ties
+    total = df["Total"].to_numpy(dtype="float64")
+    ranked = np.lexsort((-np.where(np.isnan(total), -np.inf, total), cell))
+    first = ranked[np.r_[True, np.diff(cell[ranked]) != 0]]
+    cells["Max_Total"] = total[first]
+    cells["Max_Label"] = df.index[first]
+
+    po_codes, po_values = pd.factorize(df["PONumber"])
+    po_count = max(len(po_values), 1)
+
+    def po_pairs(rows: np.ndarray) -> np.ndarray:
+        rows = rows & (po_codes >= 0)
+        return np.unique(cell[rows].astype(np.int64) * po_count + po_codes[rows])
+
+    return {
+        "cells": cells,
+        "months": month_values,
+        "categories": {col: categories for col, (categories, _) in index["facets"].items()},
+        "dtypes": {col: df[col].dtype for col in index["facets"]},
+        "has_dates": has_dates,
+        "row_cells": cell.astype(np.int32),
+        "lead_times": _lead_time_entries(cell, df),
+        "po_count": po_count,
+        "po_pairs": po_pairs(np.ones(len(df), dtype=bool)),
+        "late_po_pairs": po_pairs(measures["Late_Line"].to_numpy()) if has_dates else np.empty(0, dtype=np.int64),
+    }
+
+
+def build_po_sketches(df: pd.DataFrame, cube: Optional[Dict[str, Any]] = None) -> Dict[str, Tuple[np.ndarray, ...]]:
+    """Hash every PONumber once into HyperLogLog entries for approximate counts.
+
+    ``"rows"`` holds each row's ``(register, rank)``. With a ``cube``,
+    ``"po"`` and ``"late_po"`` hold sparse ``(cell, register, rank)`` entries
+    reduced to the highest rank per cell and register, so a cell never holds
+    more than ``2**HLL_PRECISION`` of them however many rows it covers, and any
+    set of cells merges into one sketch.
+    """
+    registers, ranks = hll_entries(df["PONumber"])
+    sketches: Dict[str, Tuple[np.ndarray, ...]] = {"rows": (registers, ranks)}
+    if cube is None:
+        return sketches
+
+    size = 1 << HLL_PRECISION
+    cells = cube["row_cells"]
+
+    def sparse(keep: np.ndarray) -> Tuple[np.ndarray, ...]:
+        keep = keep & (registers >= 0)
+        slots = cells[keep].astype(np.int64) * size + registers[keep]
+        order = np.lexsort((ranks[keep], slots))
+        # The last entry of each slot holds its highest rank
+        last = order[np.r_[slots[order][1:] != slots[order][:-1], True]]
+        return cells[keep][last], registers[keep][last], ranks[keep][last]
+
+    sketches["po"] = sparse(np.ones(len(df), dtype=bool))
+    if cube["has_dates"]:
+        sketches["late_po"] = sparse((df["RecDate"] > df["RequestDate"]).to_numpy())
+    return sketches
+
+
+def cube_cell_mask(cube: Dict[str, Any], index: Dict[str, Any], filters: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Return the cube cells selected by ``filters``, or None if a filter splits cells.
+
+    An order-date range lines up with the cube when widening it to whole
+    months adds no rows. Request-date and amount ranges line up only when they
+    keep every row that has a value. Facet selections always line up.
+    """
+    cells = cube["cells"]
+    mask = np.ones(len(cells), dtype=bool)
+
+    low, high = (pd.Timestamp(value) for value in filters["order_date_range"])
+    month_start = low.to_period("M").to_timestamp()
+    month_end = (high.to_period("M") + 1).to_timestamp() - pd.Timedelta(1, "ns")
+    start, stop = _range_bounds(index, "OrderDate", low, high)
+    wide_start, wide_stop = _range_bounds(index, "OrderDate", month_start, month_end)
+    if stop - start != wide_stop - wide_start:
+        return None
+    months = (cube["months"] >= month_start) & (cube["months"] <= month_end)
+    mask &= np.append(months, False)[cells["month"].to_numpy()]
+
+    range_filters = []
+    request_range = filters.get("request_date_range")
+    if request_range:
+        range_filters.append(("RequestDate", request_range))
+    total_min, total_max = filters.get("total_range", (None, None))
+    if total_min is not None and total_max is not None:
+        range_filters.append(("Total", (total_min, total_max)))
+    for col, (range_low, range_high) in range_filters:
+        if col not in index["ranges"]:
+            continue
+        start, stop = _range_bounds(index, col, range_low, range_high)
+        if stop - start != len(index["ranges"][col][0]):
+            return None
+        mask &= cells[f"has_{col}"].to_numpy()
+
+    for name, selection in _facet_selections(filters).items():
+        col = FACET_INDEX_COLUMNS[name]
+        if col in index["facets"]:
+            mask &= _facet_lookup(index, col, selection)[cells[col].to_numpy()]
+    return mask
+
+
+def _cube_distinct(
+    pairs: np.ndarray, po_count: int, cell_mask: np.ndarray, cell_keys: np.ndarray, key_count: int
+) -> np.ndarray:
+    """Count distinct POs per key (``cell_keys[cell]``, -1 to skip) over the selected cells."""
+    cells = pairs // po_count
+    keep = cell_mask[cells]
+    keys = cell_keys[cells[keep]]
+    valid = keys >= 0
+    combined = np.unique(keys[valid].astype(np.int64) * po_count + pairs[keep][valid] % po_count)
+    return np.bincount(combined // po_count, minlength=key_count)
+
+
+def _cube_labels(cube: Dict[str, Any], col: str, codes: np.ndarray) -> Any:
+    dtype = cube["dtypes"][col]
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(codes, dtype=dtype)
+    return cube["categories"][col][codes]
+
+
+def _cube_po_counts(
+    cube: Dict[str, Any],
+    cell_mask: np.ndarray,
+    sketches: Optional[Dict[str, Tuple[np.ndarray, ...]]],
+    kind: str,
+    cell_keys: np.ndarray,
+    key_count: int,
+) -> np.ndarray:
+    """Count distinct ``kind`` POs per key over the selected cells, exactly or from ``sketches``."""
+    if sketches is None:
+        return _cube_distinct(cube[f"{kind}_pairs"], cube["po_count"], cell_mask, cell_keys, key_count)
+    entry_cells, registers, ranks = sketches[kind]
+    keys = np.where(cell_mask[entry_cells], cell_keys[entry_cells], -1)
+    return hll_estimate(hll_merge(keys, registers, ranks, key_count))
+
+
+def cube_answers(
+    cube: Dict[str, Any], cell_mask: np.ndarray, sketches: Optional[Dict[str, Tuple[np.ndarray, ...]]] = None
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, Any]]:
+    """Answer the KPI cards and spend summaries from cube cells.
+
+    Returns the same tables as ``compute_spend_summaries`` plus the
+    ``compute_kpis`` values for the rows the selected cells cover. Distinct
+    POs are exact unless ``sketches`` (from ``build_po_sketches``) are given.
+    """
+    cells = cube["cells"]
+    selected = cells[cell_mask]
+
+    def distinct(kind: str, cell_keys: np.ndarray, key_count: int) -> np.ndarray:
+        return _cube_po_counts(cube, cell_mask, sketches, kind, cell_keys, key_count)
+
+    kpis: Dict[str, Any] = {
+        "line_items": int(selected["Order_Lines"].sum()),
+        "unique_pos": int(distinct("po", np.zeros(len(cells), dtype=np.int64), 1)[0]),
+        "open_amount": 0.0,
+        "max_total_label": None,
+    }
+    if "Open_Amount" in cells.columns and "POStatus" in cube["categories"]:
+        open_code = cube["categories"]["POStatus"].get_indexer(["OPEN"])[0]
+        if open_code >= 0:
+            kpis["open_amount"] = selected.loc[selected["POStatus"] == open_code, "Open_Amount"].sum()
+    if selected["Max_Total"].notna().any():
+        best = selected["Max_Total"].max()
+        kpis["max_total_label"] = selected.loc[selected["Max_Total"] == best, "Max_Label"].min()
+
+    tables: Dict[str, pd.DataFrame] = {"trend_summary": pd.DataFrame(), "vendor_summary": pd.DataFrame()}
+    dated = selected[selected["month"] >= 0]
+    if not dated.empty:
+        spend = dated.groupby("month")["Total_Value"].sum()
+        month_pos = distinct("po", cells["month"].to_numpy(), len(cube["months"]))
+        tables["trend_summary"] = pd.DataFrame(
+            {
+                "Order Month": cube["months"][spend.index],
+                "Total Spend": spend.to_numpy(),
+                "Unique POs": month_pos[spend.index],
+            }
+        )
+    if "VendorName" in cube["categories"]:
+        vendor = selected[selected["VendorName"] >= 0].groupby("VendorName")["Total_Value"].sum()
+        tables["vendor_summary"] = (
+            pd.DataFrame({"VendorName": _cube_labels(cube, "VendorName", vendor.index.to_numpy()), "Total": vendor.to_numpy()})
+            .sort_values("Total", ascending=False)
+            .head(10)
+        )
+    return tables, kpis
+
+
+def cube_dimension_tables(
+    cube: Dict[str, Any],
+    cell_mask: np.ndarray,
+    dimensions: Sequence[str] = DIMENSION_TABLE_COLUMNS,
+    sketches: Optional[Dict[str, Tuple[np.ndarray, ...]]] = None,
+) -> Dict[str, pd.DataFrame]:
+    """Answer ``aggregate_dimension_tables`` for ``dimensions`` from cube cells."""
+    cells = cube["cells"]
+    selected = cells[cell_mask]
+    groups = {}
+    for dim in dimensions:
+        if dim not in cube["categories"]:
+            continue
+        rows = selected[selected[dim] >= 0]
+        grouped = rows.groupby(dim).agg({col: how for col, how in CUBE_ROLLUPS.items() if col in rows.columns})
+        codes = grouped.index.to_numpy()
+        key_count = len(cube["categories"][dim])
+        dim_codes = cells[dim].to_numpy()
+        grouped.insert(0, "Unique_POs", _cube_po_counts(cube, cell_mask, sketches, "po", dim_codes, key_count)[codes])
+        if cube["has_dates"]:
+            grouped["Late_Orders"] = _cube_po_counts(cube, cell_mask, sketches, "late_po", dim_codes, key_count)[codes]
+            grouped["Avg_Days_Late"] = grouped["Days_Late_Sum"] / grouped["Late_Lines"].where(grouped["Late_Lines"] > 0)
+        grouped.index = pd.Index(_cube_labels(cube, dim, codes), name=dim)
+        groups[dim] = grouped
+    return _dimension_tables(groups, cube["has_dates"])
+
+
+def cube_lead_time_tables(cube: Dict[str, Any], cell_mask: np.ndarray) -> Dict[str, pd.DataFrame]:
+    """Answer ``compute_lead_time_tables`` by merging the selected cells' day histograms."""
+    cells = cube["cells"]
+    lead_times = {
+        metric: tuple(part[cell_mask[entry_cells]] for part in (entry_cells, days, counts))
+        for metric, (entry_cells, days, counts) in cube["lead_times"].items()
+    }
+    has_vendor = "VendorName" in cube["categories"]
+    return lead_time_tables(
+        lead_times,
+        cells["VendorName"].to_numpy() if has_vendor else None,
+        _cube_labels(cube, "VendorName", np.arange(len(cube["categories"]["VendorName"]))) if has_vendor else None,
+        cells["month"].to_numpy(),
+        cube["months"],
+    )
+
+
+# Chart outlier groupings: label -> column whose groups get their own quartiles (None = all rows)
+OUTLIER_GROUPINGS = {"Global": None, "Per purchase account": "Purchase Account", "Per vendor": "VendorName"}
+IQR_MULTIPLIER = 1.5
+
+
+def outlier_keep_mask(
+    df: pd.DataFrame, group_col: Optional[str] = None, column: str = "Total", multiplier: float = IQR_MULTIPLIER
+) -> np.ndarray:
+    """Return a row mask keeping ``column`` values within ``[Q1 - k*IQR, Q3 + k*IQR]``.
+
+    Q1 and Q3 come from one grouped quantile pass over ``group_col`` (all rows
+    when None) and are broadcast back through the group codes, so the frame
+    is never copied. Rows without a value or a group are kept.
+    """
+    if df.empty or column not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    values = df[column].to_numpy(dtype="float64")
+    if group_col is None or group_col not in df.columns:
+        codes = np.zeros(len(df), dtype=np.int64)
+    else:
+        codes = pd.factorize(df[group_col])[0]
+    # Rows without a group (code -1) stay out of the pass, so their slot keeps NaN bounds
+    grouped = codes >= 0
+    if not grouped.any():
+        return np.ones(len(df), dtype=bool)
+    quartiles = pd.Series(values[grouped]).groupby(codes[grouped]).quantile([0.25, 0.75]).unstack()
+    # Shift codes by one so missing groups (-1) land on the NaN slot
+    q1 = np.full(codes.max() + 2, np.nan)
+    q3 = np.full(codes.max() + 2, np.nan)
+    q1[quartiles.index + 1] = quartiles[0.25]
+    q3[quartiles.index + 1] = quartiles[0.75]
+    low, high = q1[codes + 1], q3[codes + 1]
+    spread = multiplier * (high - low)
+    return ~((values < low - spread) | (values > high + spread))
+
+
+def top_vendor_chart(df_filtered: pd.DataFrame, keep: np.ndarray) -> pd.DataFrame:
+    """Return the top-10 vendors by spend over the rows in ``keep``.
+
+    Dropped rows are masked out of ``Total`` rather than sliced away, so only
+    one column is copied.
+    """
+    if not {"VendorName", "Total"}.issubset(df_filtered.columns):
+        return pd.DataFrame()
+    total = df_filtered["Total"].where(keep)
+    vendor = total.groupby(df_filtered["VendorName"], observed=True).sum(min_count=1).dropna()
+    return vendor.reset_index().sort_values("Total", ascending=False).head(10)
+
+
+# Spend trend resolutions, finest first: label -> pandas period frequency.
+# TTU's fiscal year runs September 1 to August 31 and is named for the year it ends.
+TREND_RESOLUTIONS = {"Daily": "D", "Weekly": "W-SUN", "Monthly": "M", "Quarterly": "Q-DEC", "Fiscal year": "Y-AUG"}
+# Largest number of points the automatic resolution puts on the spend chart
+TREND_MAX_POINTS = 120
+
+
+def _period_labels(periods: pd.PeriodIndex, resolution: str) -> List[str]:
+    if resolution == "Weekly":
+        return ["Week of " + label for label in periods.start_time.strftime("%Y-%m-%d")]
+    if resolution == "Monthly":
+        return list(periods.strftime("%b %Y"))
+    if resolution == "Quarterly":
+        return [f"Q{quarter} {year}" for quarter, year in zip(periods.quarter, periods.year)]
+    if resolution == "Fiscal year":
+        return [f"FY{year}" for year in periods.year]
+    return list(periods.strftime("%Y-%m-%d"))
+
+
+def build_spend_days(order_dates: pd.Series, totals: pd.Series) -> Dict[str, Any]:
+    """Factorize each row's order day once, so any row slice's daily spend is two bincounts.
+
+    Rows without a date or an amount get day code -1 and are left out of
+    every pyramid.
+    """
+    codes, days = pd.factorize(order_dates.dt.normalize(), sort=True)
+    kept = (order_dates.notna() & totals.notna()).to_numpy()
+    return {
+        "days": pd.DatetimeIndex(days),
+        "row_days": np.where(kept, codes, -1).astype(np.int32),
+        "totals": totals.to_numpy(dtype="float64"),
+    }
+
+
+def time_pyramid(spend_days: Dict[str, Any], rows: Optional[np.ndarray] = None) -> Dict[str, pd.DataFrame]:
+    """Return spend and line counts per period for every ``TREND_RESOLUTIONS`` level.
+
+    ``rows`` is a boolean mask over the rows ``spend_days`` was built from
+    (all rows when None). Only the daily level reads them; every coarser
+    level is a roll-up of the days, so switching resolution never rescans
+    the data.
+    """
+    codes, totals = spend_days["row_days"], spend_days["totals"]
+    if rows is not None:
+        codes, totals = codes[rows], totals[rows]
+    present = codes >= 0
+    day_count = len(spend_days["days"])
+    lines = np.bincount(codes[present], minlength=day_count)
+    spend = np.bincount(codes[present], weights=totals[present], minlength=day_count)
+    used = lines > 0
+    daily = pd.DataFrame({"sum": spend[used], "size": lines[used]}, index=spend_days["days"][used])
+    pyramid = {}
+    for resolution, freq in TREND_RESOLUTIONS.items():
+        level = daily.groupby(daily.index.to_period(freq)).sum()
+        pyramid[resolution] = pd.DataFrame(
+            {
+                "Order Period": level.index.to_timestamp(),
+                "Period": _period_labels(level.index, resolution),
+                "Total Spend": level["sum"].to_numpy(),
+                "Order Lines": level["size"].to_numpy(),
+            }
+        )
+    return pyramid
+
+
+def pick_trend_resolution(pyramid: Dict[str, pd.DataFrame], max_points: int = TREND_MAX_POINTS) -> str:
+    """Return the finest resolution that fits the data in ``max_points`` points."""
+    for resolution in TREND_RESOLUTIONS:
+        if len(pyramid.get(resolution, ())) <= max_points:
+            return resolution
+    return list(TREND_RESOLUTIONS)[-1]
+
+
+def compute_delivery_metrics(
+    df_filtered: pd.DataFrame,
+    requisitioner: str = "All",
+    po_sketch: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, pd.DataFrame]]:
+    """Return on-time delivery figures and the delivery and late-order detail tables.
+
+    The quick insights quote late-order summaries aggregated from the late
+    rows alone, so this tab never builds the full account and requisitioner
+    tables.
+    """
+    delivery: Dict[str, Any] = {
+        "ready": False,
+        "message": "",
+        "on_time_percentage": 0.0,
+        "late_percentage": 0.0,
+        "insights": [],
+    }
+    delivery_tables = {
+        "delivery_summary": pd.DataFrame(),
+        "delivery_summary_display": pd.DataFrame(),
+        "late_orders": pd.DataFrame(),
+    }
+    insights = delivery["insights"]
+
+    if {"RecDate", "RequestDate"}.issubset(df_filtered.columns):
+        df_delivery = df_filtered.dropna(subset=["RecDate", "RequestDate"])
+
+        if not df_delivery.empty:
+            on_time_mask = df_delivery["RecDate"] <= df_delivery["RequestDate"]
+            on_time_pos = df_delivery[on_time_mask]
+            late_df = df_delivery[~on_time_mask]
+            on_time_count = _distinct_pos(on_time_pos, po_sketch)
+            late_count = _distinct_pos(late_df, po_sketch)
+            total_pos = on_time_count + late_count
+
+            delivery_summary = pd.DataFrame(
+                {
+                    "Metric": [
+                        "On-Time Orders",
+                        "Late Orders",
+                        "Total Orders",
+                        "On-Time %",
+                        "Late %",
+                    ],
+                    "Value": [
+                        on_time_count,
+                        late_count,
+                        total_pos,
+                        round((on_time_count / total_pos) * 100, 2) if total_pos else 0.0,
+                        round((late_count / total_pos) * 100, 2) if total_pos else 0.0,
+                    ],
+                }
+            )
+
+            if total_pos > 0:
+                delivery["on_time_percentage"] = (on_time_count / total_pos) * 100
+                delivery["late_percentage"] = 100 - delivery["on_time_percentage"]
+                delivery["ready"] = True
+            else:
+                delivery["message"] = "No purchase orders have both request and receive dates within the selected filters."
+
+            delivery_summary_display = delivery_summary.copy()
+            delivery_summary_display.loc[0:2, "Value"] = delivery_summary_display.loc[0:2, "Value"].map(
+                lambda x: f"{int(x):,}"
+            )
+            delivery_summary_display.loc[3:4, "Value"] = delivery_summary_display.loc[3:4, "Value"].map(
+                format_percentage
+            )
+            delivery_tables["delivery_summary"] = delivery_summary
+            delivery_tables["delivery_summary_display"] = delivery_summary_display
+
+            if not late_df.empty:
+                late_df = late_df.assign(**{"Days Late": (late_df["RecDate"] - late_df["RequestDate"]).dt.days})
+                detail_columns = [
+                    "OrderDate",
+                    "RequestDate",
+                    "RecDate",
+                    "PONumber",
+                    "Purchase Account",
+                    "Requisitioner",
+                    "VendorName",
+                    "Total",
+                    "Days Late",
+                ]
+                available_detail_columns = [
+                    col for col in detail_columns if col in late_df.columns
+                ]
+                # Kept raw; the viewer and the PDF format only what they show
+                late_orders = late_df[available_detail_columns].rename(columns={"Total": "Total Amount"})
+                delivery_tables["late_orders"] = late_orders.sort_values(
+                    by="Days Late", ascending=False, kind="stable"
+                ).reset_index(drop=True)
+
+                late_tables = aggregate_dimension_tables(late_df, po_sketch)
+                late_account_summary = late_tables["late_account"]
+                late_requisitioner_summary = late_tables["late_requisitioner"]
+                if not late_account_summary.empty:
+                    top_account = late_account_summary.iloc[0]
+                    insights.append(
+                        f"Purchase Account {top_account['Purchase Account']} has {int(top_account['Late Orders'])} late orders averaging {top_account['Avg Days Late']:.1f} days late."
+                    )
+                if not late_requisitioner_summary.empty:
+                    top_req = late_requisitioner_summary.iloc[0]
+                    insights.append(
+                        f"{top_req['Requisitioner']} has {int(top_req['Late Orders'])} late orders with up to {int(top_req['Max Days Late'])} days delay."
+                    )
+        else:
+            delivery["message"] = "No delivery performance data is available after removing rows with missing dates."
+    else:
+        delivery["message"] = "'RecDate' and/or 'RequestDate' columns are missing."
+
+    if requisitioner != "All":
+        insights.append(
+            f"Delivery metrics are scoped to requisitioner {requisitioner}."
+        )
+    return delivery, delivery_tables
+
+
+LATE_ORDER_PAGE_SIZES = [25, 50, 100]
+LATE_ORDER_SEARCH_COLUMNS = ["PONumber", "Purchase Account", "Requisitioner", "VendorName"]
+
+
+def build_late_order_index(late_orders: pd.DataFrame) -> Dict[str, Any]:
+    """Factorize each late-order column once for the paginated viewer.
+
+    Sort keys are the codes of the sorted distinct values (-1 for missing),
+    and searches match against the distinct values of the text columns.
+    """
+    codes = {}
+    values = {}
+    for col in late_orders.columns:
+        try:
+            col_codes, uniques = pd.factorize(late_orders[col], sort=True)
+        except TypeError:
+            col_codes, uniques = pd.factorize(late_orders[col].astype(str), sort=True)
+        codes[col] = col_codes
+        if col in LATE_ORDER_SEARCH_COLUMNS:
+            values[col] = pd.Index(uniques).astype(str).str.lower()
+    return {"codes": codes, "values": values, "rows": len(late_orders)}
+
+
+def late_order_positions(
+    index: Dict[str, Any], search: str = "", sort_by: str = "Days Late", descending: bool = True
+) -> np.ndarray:
+    """Return the row positions matching ``search`` in ``sort_by`` order; missing values sort last."""
+    keep = np.ones(index["rows"], dtype=bool)
+    term = search.strip().lower()
+    if term:
+        keep[:] = False
+        for col, values in index["values"].items():
+            hits = np.append(np.asarray(values.str.contains(term, regex=False), dtype=bool), False)
+            keep |= hits[index["codes"][col]]
+    positions = np.flatnonzero(keep)
+    codes = index["codes"][sort_by][positions]
+    if descending:
+        codes = np.where(codes < 0, codes, codes.max(initial=0) - codes)
+    codes = np.where(codes < 0, np.iinfo(np.int64).max, codes)
+    return positions[np.argsort(codes, kind="stable")]
+
+
+def late_order_page_count(rows: int, page_size: int) -> int:
+    """Return the pages needed for ``rows`` matches; no matches still make one (empty) page."""
+    return max(1, -(-rows // page_size))
+
+
+def late_order_page(positions: np.ndarray, page: int, page_size: int) -> Tuple[np.ndarray, int]:
+    """Return the positions on 1-based ``page`` and the offset of its first row.
+
+    Pages outside ``1..late_order_page_count`` are clamped to the nearest
+    one, so a search that shrinks the matches never strands the viewer.
+    """
+    pages = late_order_page_count(len(positions), page_size)
+    start = (min(max(int(page), 1), pages) - 1) * page_size
+    return positions[start : start + page_size], start
+
+
+def format_late_orders(late_orders: pd.DataFrame) -> pd.DataFrame:
+    """Return late-order rows with plain dates and currency strings for the PDF."""
+    formatted = late_orders.copy()
+    for col in ["OrderDate", "RequestDate", "RecDate"]:
+        if col in formatted.columns:
+            formatted[col] = formatted[col].dt.date
+    if "Total Amount" in formatted.columns:
+        formatted["Total Amount"] = format_currency_column(formatted["Total Amount"])
+    return formatted
+
+
+@dataclass(frozen=True, eq=False)
+class DashboardResult:
+    """Everything the dashboard renders for one dataset and filter state.
+
+    Equality and hashing use ``key`` (see ``dashboard_key``), so results can
+    be cached and shared across reruns and sessions. The frames are shared
+    too and must be treated as read-only. ``frame`` holds the filtered rows,
+    or ``None`` when the cube answered without taking them (see
+    ``dashboard_rows``).
+    """
+
+    key: Tuple[Any, ...]
+    frame: Optional[pd.DataFrame]
+    source: str
+    approximate: bool
+    kpis: Dict[str, Any]
+    tables: Dict[str, pd.DataFrame]
+    last_order: Optional[pd.Series]
+    spend_pyramid: Dict[str, pd.DataFrame]
+    chart_outliers: int = 0
+    requisitioner: str = "All"
+    cell_mask: Optional[np.ndarray] = None
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, DashboardResult) and self.key == other.key
+
+
+def dashboard_key(
+    digest: str, filters: Dict[str, Any], approximate: bool = False, outliers: Optional[str] = None
+) -> Tuple[Any, ...]:
+    """Return the cache key of the dashboard for a dataset and filter state."""
+    return (digest, canonical_filters(filters), approximate, outliers)
+
+
+def compute_dashboard(
+    df: pd.DataFrame,
+    filters: Dict[str, Any],
+    index: Optional[Dict[str, Any]] = None,
+    cube: Optional[Dict[str, Any]] = None,
+    digest: Optional[str] = None,
+    approximate: bool = False,
+    sketches: Optional[Dict[str, Tuple[np.ndarray, ...]]] = None,
+    outliers: Optional[str] = None,
+    keep_mask: Optional[np.ndarray] = None,
+    spend_days: Optional[Dict[str, Any]] = None,
+) -> DashboardResult:
+    """Filter ``df`` and compute the KPIs and charts the dashboard always shows.
+
+    Tab tables are left to ``compute_dashboard_section``. No Streamlit calls
+    are made, so this can be cached, reused or timed on its own. ``index``,
+    ``cube`` and ``digest`` are built or skipped when omitted:
+    without a cube every aggregate comes from the filtered rows. When the
+    cube answers, the rows are only taken if the outlier chart or the
+    requisitioner's last order needs them. With
+    ``approximate`` distinct PO counts are HyperLogLog estimates; ``sketches``
+    supplies prebuilt ``build_po_sketches`` entries for ``df`` and ``cube``.
+    ``outliers`` names an ``OUTLIER_GROUPINGS`` entry whose IQR outliers are
+    left out of the chart series (``keep_mask`` is its prebuilt mask over ``df``).
+    The spend chart gets a time pyramid at every ``TREND_RESOLUTIONS`` level,
+    sliced by the filter mask from ``spend_days`` (see ``build_spend_days``).
+    """
+    if index is None:
+        index = build_filter_index(df)
+    if digest is None:
+        digest = dataset_digest(df)
+    row_mask = filter_row_mask(index, filters)
+    requisitioner = filters.get("requisitioner", "All")
+
+    cell_mask = cube_cell_mask(cube, index, filters) if cube is not None else None
+    if approximate and sketches is None:
+        sketches = build_po_sketches(df, cube)
+    po_sketch = sketches["rows"] if approximate else None
+    df_filtered = None
+    if cell_mask is None or outliers is not None or requisitioner != "All":
+        df_filtered = df.take(np.flatnonzero(row_mask))
+    if cell_mask is not None:
+        tables, kpis = cube_answers(cube, cell_mask, sketches if approximate else None)
+    else:
+        # A partial month or narrowed range splits cube cells: aggregate the rows
+        tables = compute_spend_summaries(df_filtered, po_sketch)
+        kpis = compute_kpis(df_filtered, po_sketch)
+
+    chart_outliers = 0
+    chart_rows = row_mask
+    if outliers is not None:
+        if keep_mask is None:
+            keep_mask = outlier_keep_mask(df, OUTLIER_GROUPINGS[outliers])
+        row_keep = keep_mask[df_filtered.index.to_numpy()]
+        chart_outliers = int((~row_keep).sum())
+        tables["vendor_chart"] = top_vendor_chart(df_filtered, row_keep)
+        chart_rows = row_mask & keep_mask
+    if spend_days is None and {"OrderDate", "Total"}.issubset(df.columns):
+        spend_days = build_spend_days(df["OrderDate"], df["Total"])
+    spend_pyramid = time_pyramid(spend_days, chart_rows) if spend_days is not None else {}
+
+    last_order = None
+    if requisitioner != "All" and "OrderDate" in df_filtered.columns:
+        latest = df_filtered.sort_values(by="OrderDate", ascending=False).head(1)
+        if not latest.empty:
+            last_order = latest.iloc[0]
+
+    return DashboardResult(
+        key=dashboard_key(digest, filters, approximate, outliers),
+        frame=df_filtered,
+        source="cube" if cell_mask is not None else "rows",
+        approximate=approximate,
+        kpis=kpis,
+        tables=tables,
+        last_order=last_order,
+        spend_pyramid=spend_pyramid,
+        chart_outliers=chart_outliers,
+        requisitioner=requisitioner,
+        cell_mask=cell_mask,
+    )
+
+
+def dashboard_rows(
+    dashboard: DashboardResult, df: pd.DataFrame, filters: Dict[str, Any], index: Dict[str, Any]
+) -> pd.DataFrame:
+    """Return the filtered rows of ``dashboard``, taking them from ``df`` if the cube answered without them."""
+    if dashboard.frame is not None:
+        return dashboard.frame
+    return apply_filters(df, filters, index)
+
+
+# Lazily computed groups of tab tables, and the dimension each table group comes from
+SECTION_DIMENSIONS = {"accounts": "Purchase Account", "requisitioners": "Requisitioner"}
+DIMENSION_SECTION_TABLES = {
+    "Purchase Account": ("otd_matrix", "account_value", "late_account"),
+    "Requisitioner": ("requisitioner_value", "late_requisitioner"),
+}
+
+
+def compute_dashboard_section(
+    dashboard: DashboardResult,
+    section: str,
+    cube: Optional[Dict[str, Any]] = None,
+    sketches: Optional[Dict[str, Tuple[np.ndarray, ...]]] = None,
+    load_frame: Optional[Callable[[], pd.DataFrame]] = None,
+) -> Dict[str, Any]:
+    """Compute one section of tab tables for a ``compute_dashboard`` result.
+
+    Sections are "accounts", "requisitioners", "lead_times" and "delivery".
+    Pass the ``cube`` and ``sketches`` the result was computed
+    with (sketches are required for approximate results); without the cube
+    the filtered rows are aggregated. ``load_frame`` returns those rows and
+    is only called by sections that read them; it defaults to
+    ``dashboard.frame``.
+    """
+
+    def rows() -> pd.DataFrame:
+        return dashboard.frame if load_frame is None else load_frame()
+
+    from_cube = dashboard.cell_mask is not None and cube is not None
+    cube_sketches = sketches if dashboard.approximate else None
+    po_sketch = sketches["rows"] if dashboard.approximate else None
+    if section in SECTION_DIMENSIONS:
+        dim = SECTION_DIMENSIONS[section]
+        if from_cube:
+            dim_tables = cube_dimension_tables(cube, dashboard.cell_mask, [dim], cube_sketches)
+        else:
+            dim_tables = aggregate_dimension_tables(rows(), po_sketch, [dim])
+        return {name: dim_tables[name] for name in DIMENSION_SECTION_TABLES[dim]}
+    if section == "lead_times":
+        if from_cube:
+            return cube_lead_time_tables(cube, dashboard.cell_mask)
+        return compute_lead_time_tables(rows())
+    if section == "delivery":
+        delivery, delivery_tables = compute_delivery_metrics(rows(), dashboard.requisitioner, po_sketch)
+        return {"delivery": delivery, **delivery_tables}
+    raise ValueError(f"Unknown dashboard section: {section}")
+
+
+def tab_pdf_sections(tables: Dict[str, Any]) -> List[Tuple[str, pd.DataFrame, Optional[Callable]]]:
+    """Return the PDF sections for the loaded tab tables, skipping empty ones."""
+    sections = []
+    if tables["delivery"]["ready"] and not tables["delivery_summary"].empty:
+        sections.append(("On-Time Delivery Summary", tables["delivery_summary"].copy(), None))
+    for title, name in [
+        ("On-Time Delivery by Purchase Account", "otd_matrix"),
+        ("Purchase Account Value Summary", "account_value"),
+        ("Requisitioner Value Summary", "requisitioner_value"),
+        ("Late Orders by Purchase Account", "late_account"),
+        ("Late Orders by Requisitioner", "late_requisitioner"),
+    ]:
+        if not tables[name].empty:
+            sections.append((title, tables[name].copy(), None))
+    if not tables["late_orders"].empty:
+        sections.append(("Detailed Late Orders", tables["late_orders"], format_late_orders))
+    for title, name in [("Lead Time Summary", "lead_time_summary"), ("Lead Time by Vendor", "lead_time_by_vendor")]:
+        if not tables[name].empty:
+            sections.append((title, tables[name].copy(), None))
+    return sections
+
+
+def format_currency_column(values: pd.Series) -> pd.Series:
+    """Return ``values`` as ``$1,234.56`` strings, with missing or non-numeric entries shown as ``$0.00``."""
+    amounts = pd.to_numeric(values, errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    return pd.Series(list(map("${:,.2f}".format, amounts.tolist())), index=values.index, dtype=object)
+
+
+def format_percentage(value) -> str:
+    try:
+        return f"{value:.2f}%"
+    except (TypeError, ValueError):
+        return "0.00%"
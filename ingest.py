@@ -0,0 +1,552 @@
+# ingest.py
+#
+# Source parsing for app.py, kept free of Streamlit and Plotly so the
+# parsing pool's worker processes import only pandas, numpy, openpyxl and
+# pyarrow.
+
+
+# Standard library imports
+import csv
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Third-party imports
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # pragma: no cover - pyarrow ships with Streamlit
+    pa = None
+    pa_csv = None
+
+
+def normalize_by_unique(
+    series: pd.Series,
+    normalizer: Callable[[Any], Any],
+    normalize_missing: bool = False,
+) -> pd.Series:
+    """Apply ``normalizer`` once per distinct value and map the results back.
+
+    Label columns repeat a few hundred values across hundreds of thousands of
+    rows, so the column is factorized, only the uniques are normalized and
+    the row codes are remapped onto the normalized categories. Missing values
+    stay missing unless ``normalize_missing`` is set. Returns a categorical
+    Series aligned with ``series``.
+    """
+    codes, uniques = pd.factorize(series)
+    normalized = [normalizer(value) for value in uniques]
+    if normalize_missing and (codes == -1).any():
+        codes = np.where(codes == -1, len(normalized), codes)
+        normalized.append(normalizer(np.nan))
+    final_codes, categories = pd.factorize(pd.Series(normalized, dtype=object), sort=True)
+    row_codes = final_codes[codes] if len(final_codes) else codes
+    row_codes = np.where(codes == -1, -1, row_codes)
+    return pd.Series(
+        pd.Categorical.from_codes(row_codes, categories=categories),
+        index=series.index,
+        name=series.name,
+    )
+
+
+def account_digits(value: Any) -> str:
+    """Return only the digits of ``value``, so formatted account codes compare equal."""
+    return re.sub(r"[^0-9]", "", str(value))
+
+
+# Rows held in memory at once while a source is parsed and normalized
+STREAM_CHUNK_ROWS = 50_000
+NUMERIC_SOURCE_COLUMNS = ["Total", "Amt", "QtyOrdered", "QtyRemaining"]
+ACCOUNT_SOURCE_COLUMNS = ["Acct", "Purchase Account"]
+# Export columns that number the lines of a PO; the first one present becomes ``POLine``
+LINE_SOURCE_COLUMNS = ["POLine", "Line", "LineNumber", "Line Number", "LineNo"]
+# Source columns the dashboard uses; every other export column is skipped while parsing
+SOURCE_COLUMN_MANIFEST = [
+    "OrderDate",
+    "RequestDate",
+    "RecDate",
+    "PONumber",
+    "VendorName",
+    "Requisitioner",
+    *ACCOUNT_SOURCE_COLUMNS,
+    *NUMERIC_SOURCE_COLUMNS,
+    "POStatus",
+    *LINE_SOURCE_COLUMNS,
+]
+
+
+# Text layouts tried, in order, when a date column arrives as strings
+DATE_FORMAT_CANDIDATES = [
+    "%Y-%m-%d",
+    "%m/%d/%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%y",
+    "%d-%b-%Y",
+    "%Y%m%d",
+]
+# Distinct strings sampled to pick a format
+DATE_FORMAT_SAMPLE = 200
+
+
+def is_date_column(name: Any) -> bool:
+    return "date" in str(name).lower()
+
+
+def _detect_date_format(values: pd.Series) -> Optional[str]:
+    """Return the candidate format that parses the most sampled strings."""
+    sample = values.head(DATE_FORMAT_SAMPLE)
+    best_format, best_parsed = None, 0
+    for fmt in DATE_FORMAT_CANDIDATES:
+        parsed = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if parsed > best_parsed:
+            best_format, best_parsed = fmt, parsed
+        if parsed == len(sample):
+            break
+    return best_format
+
+
+def coerce_date_column(series: pd.Series, date_format: Optional[str] = None) -> Tuple[pd.Series, Optional[str]]:
+    """Parse ``series`` to midnight-normalized ``datetime64`` values.
+
+    Columns that are already ``datetime64`` are only normalized and brought
+    to nanosecond resolution (pyarrow hands back ``datetime64[s]`` or
+    ``[us]`` for some sources). Otherwise
+    the column is factorized and only its distinct values are parsed: text
+    values with ``date_format`` (detected from a sample when not given) and
+    Excel date cells directly. Text that ``date_format`` rejects is parsed
+    value by value with ``format="mixed"``, so a column mixing layouts keeps
+    its dates; only values no layout parses become ``NaT``. Returns the
+    parsed column and the text format that was used.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.normalize().dt.as_unit("ns"), date_format
+
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object)
+    is_text = uniques.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype="datetime64[ns]")
+    if is_text.any():
+        text_values = uniques[is_text].str.strip()
+        if date_format is None:
+            date_format = _detect_date_format(text_values)
+        if date_format is not None:
+            text_parsed = pd.to_datetime(text_values, format=date_format, errors="coerce")
+            rejected = text_parsed.isna() & (text_values != "")
+            if rejected.any():
+                text_parsed[rejected] = pd.to_datetime(text_values[rejected], format="mixed", errors="coerce")
+            parsed[is_text] = text_parsed
+        else:
+            parsed[is_text] = pd.to_datetime(text_values, format="mixed", errors="coerce")
+    if (~is_text).any():
+        parsed[~is_text] = pd.to_datetime(uniques[~is_text], errors="coerce")
+
+    normalized = pd.DatetimeIndex(parsed).normalize()
+    values = normalized.take(codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(values, index=series.index, name=series.name), date_format
+
+
+def _normalize_chunk(
+    chunk: pd.DataFrame, date_formats: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """Coerce dates, numbers and account codes of one parsed chunk.
+
+    Missing values are left missing so the row-level checks in
+    ``load_and_process_data`` still see and count them. ``date_formats``
+    carries the text format detected for each date column from one chunk
+    to the next, so detection runs once per source.
+    """
+    if date_formats is None:
+        date_formats = {}
+    for col in chunk.columns:
+        if is_date_column(col):
+            chunk[col], detected = coerce_date_column(chunk[col], date_formats.get(col))
+            if detected is not None:
+                date_formats[col] = detected
+    for col in NUMERIC_SOURCE_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+    for col in ACCOUNT_SOURCE_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = normalize_by_unique(chunk[col], account_digits)
+    return chunk
+
+
+def _header_labels(header: Tuple[Any, ...]) -> List[str]:
+    """Name blank and repeated header cells the way ``pd.read_excel`` does."""
+    labels: List[str] = []
+    seen: Dict[str, int] = {}
+    for idx, value in enumerate(header):
+        label = f"Unnamed: {idx}" if value is None else str(value)
+        if label in seen:
+            seen[label] += 1
+            label = f"{label}.{seen[label]}"
+        else:
+            seen[label] = 0
+        labels.append(label)
+    return labels
+
+
+# Parsed frames carry one 64-bit hash per row over the columns projection
+# skipped, so deduplication can still tell rows apart on those columns. Sources
+# with a line column (``LINE_SOURCE_COLUMNS``) already identify each row by PO
+# and line, so their skipped columns are never read and the hash is zero.
+SKIPPED_HASH_COLUMN = "__skipped_hash__"
+
+
+def _hashes_skipped(columns: Sequence[Any], usecols: Optional[Sequence[str]]) -> bool:
+    """Return whether a source with ``columns`` needs its skipped columns hashed."""
+    return usecols is not None and not any(col in LINE_SOURCE_COLUMNS for col in columns)
+
+
+def _cell_text(value: Any) -> str:
+    """Render a skipped cell as text, so ``3`` and ``3.0`` compare equal whatever type a reader gave them."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def _skipped_hashes(skipped: pd.DataFrame) -> np.ndarray:
+    """Return one 64-bit hash per row over the columns of ``skipped``.
+
+    Columns are taken in name order and compared as ``_cell_text``, each
+    rendered once per distinct value. A frame without columns hashes every
+    row to zero.
+    """
+    if not len(skipped.columns):
+        return np.zeros(len(skipped), dtype=np.uint64)
+    order = sorted(range(len(skipped.columns)), key=lambda idx: str(skipped.columns[idx]))
+    text = pd.DataFrame(
+        {
+            position: normalize_by_unique(skipped.iloc[:, idx], _cell_text, normalize_missing=True)
+            for position, idx in enumerate(order)
+        },
+        index=skipped.index,
+    )
+    return pd.util.hash_pandas_object(text, index=False).to_numpy()
+
+
+def _project_frame(
+    frame: pd.DataFrame, usecols: Optional[Sequence[str]], date_formats: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """Normalize the ``usecols`` columns of a read ``frame`` and hash the rest.
+
+    The skipped columns are reduced to ``SKIPPED_HASH_COLUMN`` and dropped,
+    or ignored when ``_hashes_skipped`` says the source does not need them;
+    with ``usecols=None`` every column is kept and nothing is hashed.
+    """
+    if usecols is None:
+        return _normalize_chunk(frame, date_formats)
+    wanted = set(usecols)
+    kept = [idx for idx, col in enumerate(frame.columns) if col in wanted]
+    skipped = [idx for idx, col in enumerate(frame.columns) if col not in wanted]
+    projected = _normalize_chunk(frame.iloc[:, kept].copy(), date_formats)
+    if _hashes_skipped(frame.columns, usecols):
+        projected[SKIPPED_HASH_COLUMN] = _skipped_hashes(frame.iloc[:, skipped])
+    else:
+        projected[SKIPPED_HASH_COLUMN] = np.zeros(len(projected), dtype=np.uint64)
+    return projected
+
+
+def _read_workbook_streaming(
+    payload: bytes,
+    chunk_rows: int = STREAM_CHUNK_ROWS,
+    usecols: Optional[Sequence[str]] = SOURCE_COLUMN_MANIFEST,
+) -> pd.DataFrame:
+    """Read the first worksheet row by row without building the cell model.
+
+    openpyxl's read-only mode yields plain value tuples, which are collected
+    ``chunk_rows`` at a time and normalized before the next chunk is read, so
+    peak memory follows the chunk size rather than the workbook size. Only
+    the header columns listed in ``usecols`` are kept; the cells of the
+    others are hashed in the same pass (see ``_project_frame``).
+    """
+    workbook = load_workbook(BytesIO(payload), read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # Exported workbooks often carry a stale dimension record
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        labels = _header_labels(header)
+        width = len(labels)
+
+        chunks: List[pd.DataFrame] = []
+        pending: List[Tuple[Any, ...]] = []
+        date_formats: Dict[str, str] = {}
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            pending.append(row[:width])
+            if len(pending) >= chunk_rows:
+                chunks.append(
+                    _project_frame(pd.DataFrame.from_records(pending, columns=labels), usecols, date_formats)
+                )
+                pending = []
+        if pending or not chunks:
+            chunks.append(
+                _project_frame(pd.DataFrame.from_records(pending, columns=labels), usecols, date_formats)
+            )
+    finally:
+        workbook.close()
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+def _read_csv_streaming(
+    buffer: BytesIO,
+    chunk_rows: int = STREAM_CHUNK_ROWS,
+    usecols: Optional[Sequence[str]] = SOURCE_COLUMN_MANIFEST,
+    read_columns: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    date_formats: Dict[str, str] = {}
+    chunks = [
+        _project_frame(chunk, usecols, date_formats)
+        for chunk in pd.read_csv(
+            buffer,
+            chunksize=chunk_rows,
+            usecols=read_columns,
+            dtype={col: str for col in ACCOUNT_SOURCE_COLUMNS},
+        )
+    ]
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+def _csv_header(payload: bytes) -> List[str]:
+    """Read just the header line of a CSV payload."""
+    first_line = payload[:65536].split(b"\n", 1)[0]
+    return next(csv.reader([first_line.decode("utf-8-sig", errors="replace").rstrip("\r")]), [])
+
+
+def _read_csv_source(
+    payload: bytes, usecols: Optional[Sequence[str]] = SOURCE_COLUMN_MANIFEST
+) -> pd.DataFrame:
+    """Parse CSV text with pyarrow's multithreaded reader when it is available.
+
+    Only the ``usecols`` columns are read, unless the skipped columns must be
+    hashed (see ``_hashes_skipped``); those are then read as plain strings,
+    with no type inference.
+    """
+    header = _csv_header(payload)
+    wanted = set(header) if usecols is None else set(usecols)
+    read_columns = None if _hashes_skipped(header, usecols) else [col for col in header if col in wanted]
+    if pa_csv is not None:
+        as_text = ACCOUNT_SOURCE_COLUMNS + ([col for col in header if col not in wanted] if read_columns is None else [])
+        try:
+            table = pa_csv.read_csv(
+                BytesIO(payload),
+                read_options=pa_csv.ReadOptions(use_threads=True),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=read_columns,
+                    column_types={col: pa.string() for col in as_text},
+                    # Blank text cells become NaN, as they do with pandas
+                    strings_can_be_null=True,
+                    quoted_strings_can_be_null=True,
+                ),
+            )
+            return _project_frame(table.to_pandas(), usecols)
+        except (pa.ArrowInvalid, KeyError, UnicodeDecodeError):
+            # pandas tolerates ragged rows and odd encodings that pyarrow rejects
+            pass
+    return _read_csv_streaming(BytesIO(payload), usecols=usecols, read_columns=read_columns)
+
+
+def _sniff_source_format(payload: bytes) -> str:
+    """Identify a payload from its leading bytes: ``xlsx``, ``xls``, ``csv`` or ``unknown``."""
+    if payload.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if payload.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return "xls"
+    sample = payload[:4096]
+    if sample and b"\x00" not in sample:
+        return "csv"
+    return "unknown"
+
+
+def read_source_frame(
+    name: str, payload: bytes, usecols: Optional[Sequence[str]] = SOURCE_COLUMN_MANIFEST
+) -> pd.DataFrame:
+    source_format = _sniff_source_format(payload)
+    if source_format == "xlsx":
+        return _read_workbook_streaming(payload, usecols=usecols)
+    if source_format == "csv":
+        return _read_csv_source(payload, usecols=usecols)
+    if source_format == "xls":
+        try:
+            return _project_frame(pd.read_excel(BytesIO(payload)), usecols)
+        except ImportError as exc:
+            raise ValueError("legacy .xls workbooks need the xlrd package installed") from exc
+    raise ValueError("not an Excel workbook or CSV file")
+
+
+# On-disk cache of parsed sources, keyed by a hash of the uploaded bytes
+PARSED_CACHE_DIR = Path(os.environ.get("TTU_PARSED_CACHE_DIR", ".cache/parsed_sources"))
+PARSED_CACHE_MAX_BYTES = int(os.environ.get("TTU_PARSED_CACHE_MAX_MB", "512")) * 1024 * 1024
+# Bump whenever read_source_frame starts returning differently shaped frames
+PARSED_CACHE_VERSION = "7"
+
+
+def _source_cache_key(payload: bytes) -> str:
+    # The column manifest is part of the key so a projection change re-parses
+    digest = hashlib.sha256(PARSED_CACHE_VERSION.encode("utf-8"))
+    digest.update("|".join(SOURCE_COLUMN_MANIFEST).encode("utf-8"))
+    digest.update(payload)
+    return digest.hexdigest()
+
+
+def _load_cached_source(key: str) -> Optional[pd.DataFrame]:
+    """Return the cached frame for ``key`` or ``None`` on a miss."""
+    path = PARSED_CACHE_DIR / f"{key}.parquet"
+    if not path.exists():
+        return None
+    try:
+        frame = pd.read_parquet(path)
+        # Touch the entry so eviction treats it as recently used
+        os.utime(path)
+    except Exception:
+        return None
+    return frame
+
+
+def _store_cached_source(key: str, frame: pd.DataFrame) -> None:
+    """Write ``frame`` to the cache; frames Parquet cannot represent are skipped."""
+    path = PARSED_CACHE_DIR / f"{key}.parquet"
+    temp_path = path.with_name(f"{key}.{os.getpid()}.tmp")
+    try:
+        PARSED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        frame.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
+    except Exception:
+        temp_path.unlink(missing_ok=True)
+        return
+    _evict_parsed_cache(PARSED_CACHE_MAX_BYTES)
+
+
+def _evict_parsed_cache(max_bytes: int) -> None:
+    """Delete least recently used entries until the cache fits in ``max_bytes``."""
+    entries = []
+    for path in PARSED_CACHE_DIR.glob("*.parquet"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total_bytes <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total_bytes -= size
+
+
+def purge_parsed_cache() -> int:
+    """Remove every cached source and return how many entries were deleted."""
+    removed = 0
+    if PARSED_CACHE_DIR.exists():
+        for path in PARSED_CACHE_DIR.iterdir():
+            if path.suffix in {".parquet", ".tmp"}:
+                path.unlink(missing_ok=True)
+                removed += path.suffix == ".parquet"
+    return removed
+
+
+def default_ingest_workers() -> int:
+    """Return the worker count used to parse uploads in parallel.
+
+    ``TTU_INGEST_WORKERS`` overrides the default of one worker per CPU,
+    capped at four so a shared host is not saturated by a single upload.
+    """
+    configured = os.environ.get("TTU_INGEST_WORKERS", "")
+    if configured.strip().isdigit():
+        return max(1, int(configured))
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+# Uploads smaller than this in total are parsed in-process even with a pool
+INGEST_PARALLEL_MIN_BYTES = int(os.environ.get("TTU_INGEST_PARALLEL_MIN_MB", "4")) * 1024 * 1024
+
+
+def _parse_source(source: Tuple[str, bytes]) -> Tuple[str, Optional[pd.DataFrame], Optional[str]]:
+    """Parse one uploaded payload; runs inside a worker process or in-process.
+
+    Returns the source name, the parsed frame (``None`` on failure) and a
+    readable error message when parsing failed.
+    """
+    name, payload = source
+    try:
+        return name, read_source_frame(name, payload), None
+    except Exception as exc:
+        return name, None, str(exc) or type(exc).__name__
+
+
+def create_ingest_pool(workers: int) -> ProcessPoolExecutor:
+    """Return a parsing pool for ``read_sources``; its processes start on first use.
+
+    Workers are spawned rather than forked, since the Streamlit server is
+    multithreaded. Each one imports this module, not the dashboard, so a
+    worker's start-up cost is pandas, openpyxl and pyarrow. The pool is meant
+    to be kept and reused, so that cost is paid once per worker.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def read_sources(
+    file_payloads: Tuple[Tuple[str, bytes], ...], pool: Optional[ProcessPoolExecutor] = None
+) -> Tuple[List[Tuple[str, Optional[pd.DataFrame], Optional[str]]], Optional[str]]:
+    """Parse every payload, fanning out to ``pool`` when it is worth it.
+
+    Sources already in the on-disk cache are loaded from it; only new or
+    changed payloads are parsed. They go to ``pool`` only when there are at
+    least two of them and together they reach ``INGEST_PARALLEL_MIN_BYTES``;
+    smaller uploads parse faster in this process than they pickle to and from
+    a worker. Results are returned in upload order regardless of which worker
+    finishes first. If the pool cannot be started or a worker dies, the
+    payloads are parsed serially and the reason is returned alongside the
+    results (``None`` otherwise); a broken pool must not be reused.
+    """
+    sources = [(name, payload) for name, payload in file_payloads if payload is not None]
+    keys = [_source_cache_key(payload) for _, payload in sources]
+    results: List[Tuple[str, Optional[pd.DataFrame], Optional[str]]] = [
+        (name, _load_cached_source(key), None) for (name, _), key in zip(sources, keys)
+    ]
+    pending = [idx for idx, (_, frame, _) in enumerate(results) if frame is None]
+    if not pending:
+        return results, None
+
+    to_parse = [sources[idx] for idx in pending]
+    parsed = None
+    fallback = None
+    pending_bytes = sum(len(payload) for _, payload in to_parse)
+    if pool is not None and len(to_parse) > 1 and pending_bytes >= INGEST_PARALLEL_MIN_BYTES:
+        try:
+            parsed = list(pool.map(_parse_source, to_parse))
+        except (BrokenProcessPool, OSError) as exc:
+            fallback = str(exc) or type(exc).__name__
+            parsed = None
+    if parsed is None:
+        parsed = [_parse_source(source) for source in to_parse]
+
+    for idx, (name, frame, error) in zip(pending, parsed):
+        results[idx] = (name, frame, error)
+        if frame is not None:
+            _store_cached_source(keys[idx], frame)
+    return results, fallback
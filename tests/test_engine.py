@@ -0,0 +1,364 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+
+
+def purchase_orders(rows=400, seed=7):
+    """Return a processed-shape frame with a few missing values in every column."""
+    rng = np.random.default_rng(seed)
+    order_dates = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 540, rows), unit="D")
+    request_dates = order_dates + pd.to_timedelta(rng.integers(3, 40, rows), unit="D")
+    frame = pd.DataFrame(
+        {
+            "OrderDate": order_dates,
+            "RequestDate": request_dates,
+            "RecDate": request_dates + pd.to_timedelta(rng.integers(-10, 15, rows), unit="D"),
+            "PONumber": [f"P{value}" for value in rng.integers(0, rows // 3, rows)],
+            "Purchase Account": rng.choice(["110100", "220200", "330300"], rows),
+            "Requisitioner": rng.choice(["Avery", "Blake", "Casey", "Drew"], rows),
+            "VendorName": rng.choice(["Acme", "Lubbock Tech", "Plains Hardware", "Central Office"], rows),
+            "POStatus": rng.choice(["OPEN", "RECEIVED", "NEW", "BACKORDERED"], rows),
+            "Total": np.round(rng.gamma(2.0, 150.0, rows), 2),
+        }
+    )
+    frame.loc[rng.random(rows) < 0.05, "RequestDate"] = pd.NaT
+    frame.loc[rng.random(rows) < 0.05, "RecDate"] = pd.NaT
+    frame.loc[rng.random(rows) < 0.03, "VendorName"] = None
+    frame.loc[rng.random(rows) < 0.03, "Requisitioner"] = None
+    for col in ["Purchase Account", "Requisitioner", "VendorName", "POStatus"]:
+        frame[col] = frame[col].astype("category")
+    return frame.sort_values("OrderDate", kind="stable").reset_index(drop=True)
+
+
+def filters(**overrides):
+    state = {
+        "order_date_range": (date(2023, 1, 1), date(2024, 6, 30)),
+        "request_date_range": None,
+        "purchase_account": "All",
+        "requisitioner": "All",
+        "vendors": [],
+        "statuses": [],
+        "total_range": (None, None),
+    }
+    state.update(overrides)
+    return state
+
+
+def chained_filters(df, state):
+    """The original apply_filters: one boolean pass and one filtered frame per filter."""
+    filtered = df.copy()
+    order_start, order_end = state["order_date_range"]
+    filtered = filtered[
+        (filtered["OrderDate"] >= pd.to_datetime(order_start)) & (filtered["OrderDate"] <= pd.to_datetime(order_end))
+    ]
+    request_range = state.get("request_date_range")
+    if request_range and "RequestDate" in filtered.columns:
+        req_start, req_end = request_range
+        filtered = filtered[
+            (filtered["RequestDate"] >= pd.to_datetime(req_start)) & (filtered["RequestDate"] <= pd.to_datetime(req_end))
+        ]
+    if state.get("purchase_account") and state["purchase_account"] != "All":
+        filtered = filtered[filtered["Purchase Account"] == state["purchase_account"]]
+    if state.get("requisitioner") and state["requisitioner"] != "All":
+        filtered = filtered[filtered["Requisitioner"] == state["requisitioner"]]
+    if state.get("vendors"):
+        filtered = filtered[filtered["VendorName"].isin(state["vendors"])]
+    if state.get("statuses"):
+        filtered = filtered[filtered["POStatus"].isin(state["statuses"])]
+    total_min, total_max = state.get("total_range", (None, None))
+    if total_min is not None and total_max is not None and "Total" in filtered.columns:
+        filtered = filtered[(filtered["Total"] >= total_min) & (filtered["Total"] <= total_max)]
+    return filtered
+
+
+FILTER_STATES = [
+    filters(),
+    filters(order_date_range=(date(2023, 3, 15), date(2023, 3, 15))),
+    filters(order_date_range=(date(2023, 2, 1), date(2023, 11, 30)), request_date_range=(date(2023, 3, 1), date(2023, 9, 30))),
+    filters(purchase_account="220200", requisitioner="Blake"),
+    filters(vendors=["Acme", "Plains Hardware"], statuses=["OPEN"]),
+    filters(vendors=["No Such Vendor"]),
+    filters(requisitioner="Nobody"),
+    filters(total_range=(100.0, 250.5)),
+    filters(
+        order_date_range=(date(2023, 6, 1), date(2024, 1, 31)),
+        purchase_account="110100",
+        vendors=["Lubbock Tech", "Central Office"],
+        statuses=["RECEIVED", "BACKORDERED"],
+        total_range=(0.0, 400.0),
+    ),
+]
+
+
+@pytest.mark.parametrize("state", FILTER_STATES)
+def test_indexed_filters_match_the_boolean_chain(state):
+    df = purchase_orders()
+    index = engine.build_filter_index(df)
+    expected = chained_filters(df, state)
+    pd.testing.assert_frame_equal(engine.apply_filters(df, state, index), expected)
+    assert np.flatnonzero(engine.filter_row_mask(index, state)).tolist() == expected.index.tolist()
+
+
+def test_filter_masks_cover_only_active_filters():
+    index = engine.build_filter_index(purchase_orders())
+    masks = engine.filter_masks(index, filters(vendors=["Acme"], total_range=(10.0, 20.0)))
+    assert sorted(masks) == ["order_date_range", "total_range", "vendors"]
+
+
+def test_range_bounds_are_inclusive_and_skip_missing_values():
+    df = pd.DataFrame(
+        {
+            "OrderDate": pd.to_datetime(["2023-01-01", "2023-01-31", "2023-02-01"]),
+            "RequestDate": pd.to_datetime(["2023-01-10", None, "2023-02-10"]),
+            "Total": [5.0, 10.0, 10.01],
+        }
+    )
+    index = engine.build_filter_index(df)
+    state = filters(
+        order_date_range=(date(2023, 1, 1), date(2023, 2, 1)),
+        request_date_range=(date(2023, 1, 1), date(2023, 12, 31)),
+        total_range=(5.0, 10.0),
+    )
+    assert engine.filter_row_mask(index, state).tolist() == [True, False, False]
+
+
+def test_filter_result_cache_evicts_least_recently_used():
+    frame = pd.DataFrame({"x": np.zeros(10)})
+    nbytes = engine._result_nbytes(frame)
+    cache = engine.FilterResultCache(max_bytes=2 * nbytes)
+    cache.put("a", frame)
+    cache.put("b", frame)
+    assert cache.get("a") is frame
+    cache.put("c", frame)
+    assert cache.get("b") is None
+    assert cache.get("a") is frame
+    assert cache.get("c") is frame
+    assert cache.stats() == {"hits": 3, "misses": 1, "entries": 2, "bytes": 2 * nbytes}
+
+
+def test_filter_result_cache_skips_values_over_the_bound():
+    cache = engine.FilterResultCache(max_bytes=8)
+    cache.put("big", "x" * 9)
+    assert cache.get("big") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_filter_keys_ignore_selection_order_and_value_types():
+    first = filters(vendors=["Acme", "Plains Hardware"], total_range=(10, 20))
+    second = filters(vendors=["Plains Hardware", "Acme"], total_range=(10.0, 20.0))
+    assert engine.dashboard_key("digest", first) == engine.dashboard_key("digest", second)
+    assert engine.dashboard_key("digest", first) != engine.dashboard_key("other", first)
+    assert engine.dashboard_key("digest", first) != engine.dashboard_key("digest", first, approximate=True)
+
+
+def test_cached_facet_counts_reuse_a_filter_state():
+    df = purchase_orders()
+    index = engine.build_filter_index(df)
+    cache = engine.FilterResultCache(max_bytes=1 << 20)
+    counts = engine.cached_facet_counts(cache, "digest", index, filters(statuses=["OPEN"]))
+    again = engine.cached_facet_counts(cache, "digest", index, filters(statuses=["OPEN"]))
+    assert again is counts
+    assert cache.stats()["hits"] == 1
+    # Each facet is counted under every filter but its own
+    expected = df["POStatus"].value_counts()
+    assert counts["POStatus"].to_dict() == expected.to_dict()
+    assert counts["VendorName"].sum() == df["VendorName"][df["POStatus"] == "OPEN"].notna().sum()
+
+
+WHOLE_MONTH_STATES = [
+    filters(),
+    filters(
+        order_date_range=(date(2023, 2, 1), date(2023, 10, 31)),
+        vendors=["Acme", "Lubbock Tech"],
+        statuses=["OPEN", "RECEIVED"],
+    ),
+    filters(purchase_account="330300", requisitioner="Casey"),
+]
+
+
+def assert_same_answers(from_cube, from_rows, cube, sketches=None, sections=("accounts", "requisitioners")):
+    assert from_cube.kpis == pytest.approx(from_rows.kpis)
+    assert sorted(from_cube.tables) == sorted(from_rows.tables)
+    for name, table in from_cube.tables.items():
+        pd.testing.assert_frame_equal(table, from_rows.tables[name], check_dtype=False)
+    for section in sections:
+        cube_tables = engine.compute_dashboard_section(from_cube, section, cube=cube, sketches=sketches)
+        row_tables = engine.compute_dashboard_section(from_rows, section, sketches=sketches)
+        for name, table in cube_tables.items():
+            pd.testing.assert_frame_equal(table, row_tables[name], check_dtype=False)
+
+
+@pytest.mark.parametrize("state", WHOLE_MONTH_STATES)
+def test_cube_answers_match_row_level_aggregates(state):
+    df = purchase_orders()
+    df["Amt"] = df["Total"] / 2
+    index = engine.build_filter_index(df)
+    cube = engine.build_order_cube(df, index)
+    from_cube = engine.compute_dashboard(df, state, index, cube, digest="digest")
+    from_rows = engine.compute_dashboard(df, state, index, None, digest="digest")
+    assert from_cube.cell_mask is not None
+    # Rows are only taken for a requisitioner's last order
+    assert (from_cube.frame is None) == (state["requisitioner"] == "All")
+    assert from_rows.cell_mask is None
+    assert_same_answers(from_cube, from_rows, cube, sections=("accounts", "requisitioners", "lead_times"))
+
+
+@pytest.mark.parametrize("state", WHOLE_MONTH_STATES)
+def test_cube_sketches_match_row_sketches(state):
+    df = purchase_orders()
+    index = engine.build_filter_index(df)
+    cube = engine.build_order_cube(df, index)
+    sketches = engine.build_po_sketches(df, cube)
+    from_cube = engine.compute_dashboard(df, state, index, cube, "digest", approximate=True, sketches=sketches)
+    from_rows = engine.compute_dashboard(df, state, index, None, "digest", approximate=True, sketches=sketches)
+    assert_same_answers(from_cube, from_rows, cube, sketches)
+
+
+def test_cube_declines_filters_that_split_cells():
+    df = purchase_orders()
+    index = engine.build_filter_index(df)
+    cube = engine.build_order_cube(df, index)
+    assert engine.cube_cell_mask(cube, index, filters(order_date_range=(date(2023, 2, 3), date(2023, 10, 31)))) is None
+    assert engine.cube_cell_mask(cube, index, filters(total_range=(0.0, 100.0))) is None
+    # A range that keeps every row with a value still lines up with the cells
+    assert engine.cube_cell_mask(cube, index, filters(total_range=(0.0, 1e9))) is not None
+
+
+def test_approx_distinct_stays_within_the_stated_error():
+    values = pd.Series([f"PO{i}" for i in range(30000)] + [f"PO{i}" for i in range(10000)] + [None] * 50)
+    # Key 0 holds every PO once, key 1 the first 10,000 again; missing values are never counted
+    keys = np.repeat([0, 1, 1], [30000, 10000, 50])
+    estimates = engine.approx_distinct(values, engine.hll_entries(values), keys, 2)
+    tolerance = 4 * engine.hll_relative_error()
+    assert np.all(np.abs(estimates - [30000, 10000]) <= tolerance * np.array([30000, 10000]))
+
+
+def test_hll_sketches_merge_like_the_union():
+    values = pd.Series([f"PO{i}" for i in range(5000)])
+    registers, ranks = engine.hll_entries(values)
+    halves = np.repeat([0, 1], [3000, 2000])
+    per_half = engine.hll_merge(halves, registers, ranks, 2)
+    whole = engine.hll_merge(np.zeros(len(values), dtype=np.int64), registers, ranks, 1)
+    np.testing.assert_array_equal(np.maximum(per_half[0], per_half[1]), whole[0])
+    # Small counts use linear counting and are close to exact
+    assert abs(engine.hll_estimate(whole)[0] - 5000) <= 0.05 * 5000
+
+
+def test_outlier_keep_mask_uses_per_group_quartiles():
+    df = pd.DataFrame(
+        {
+            "Total": [10.0, 11.0, 12.0, 13.0, 500.0, 1000.0, 1010.0, 1020.0, 1030.0, np.nan],
+            "VendorName": ["a"] * 5 + ["b"] * 4 + ["a"],
+        }
+    )
+    assert engine.outlier_keep_mask(df, "VendorName").tolist() == [True] * 4 + [False] + [True] * 5
+    # Pooled, the small orders sit inside the wide spread and nothing is flagged
+    assert engine.outlier_keep_mask(df).all()
+
+
+def test_outliers_leave_the_charts_but_not_the_tables():
+    df = purchase_orders()
+    df.loc[5, "Total"] = 1_000_000.0
+    state = filters()
+    kept = engine.compute_dashboard(df, state, outliers="Global")
+    every = engine.compute_dashboard(df, state)
+    assert kept.chart_outliers >= 1
+    assert kept.kpis == every.kpis
+    assert every.spend_pyramid["Monthly"]["Total Spend"].sum() - kept.spend_pyramid["Monthly"]["Total Spend"].sum() >= 1_000_000.0
+    assert kept.tables["vendor_chart"]["Total"].sum() < every.tables["vendor_summary"]["Total"].sum()
+
+
+def test_fiscal_year_runs_september_to_august():
+    dates = pd.Series(pd.to_datetime(["2022-08-31", "2022-09-01", "2023-08-31", "2023-09-01", None]))
+    totals = pd.Series([1.0, 2.0, 4.0, 8.0, 16.0])
+    fiscal = engine.time_pyramid(engine.build_spend_days(dates, totals))["Fiscal year"]
+    assert fiscal["Period"].tolist() == ["FY2022", "FY2023", "FY2024"]
+    assert fiscal["Total Spend"].tolist() == [1.0, 6.0, 8.0]
+    assert fiscal["Order Lines"].tolist() == [1, 2, 1]
+
+
+def test_time_pyramid_rolls_up_only_masked_rows():
+    dates = pd.Series(pd.to_datetime(["2023-01-02", "2023-01-03", "2023-02-10"]))
+    totals = pd.Series([1.0, 2.0, 4.0])
+    pyramid = engine.time_pyramid(engine.build_spend_days(dates, totals), rows=np.array([True, False, True]))
+    assert pyramid["Monthly"]["Period"].tolist() == ["Jan 2023", "Feb 2023"]
+    assert pyramid["Monthly"]["Total Spend"].tolist() == [1.0, 4.0]
+    assert engine.pick_trend_resolution(pyramid, max_points=1) == "Quarterly"
+
+
+def test_spend_trend_groups_on_the_order_month():
+    df = pd.DataFrame(
+        {
+            "OrderDate": pd.to_datetime(["2023-01-31", "2023-01-02", None, "2023-03-01"]),
+            "PONumber": ["P1", "P2", "P3", "P1"],
+            "Total": [1.0, 2.0, 4.0, 8.0],
+            "VendorName": ["a", "b", "a", "a"],
+        }
+    )
+    trend = engine.compute_spend_summaries(df)["trend_summary"]
+    assert trend["Order Month"].tolist() == [pd.Timestamp("2023-01-01"), pd.Timestamp("2023-03-01")]
+    assert trend["Total Spend"].tolist() == [3.0, 8.0]
+    assert trend["Unique POs"].tolist() == [2, 1]
+
+
+def test_histogram_percentiles_use_nearest_rank():
+    keys = np.array([0, 0, 0, 1, -1])
+    days = np.array([1, 5, 9, 3, 100])
+    counts = np.array([2, 1, 1, 4, 7])
+    totals, means, values = engine.histogram_percentiles(keys, days, counts, 3, [50, 90])
+    assert totals.tolist() == [4, 4, 0]
+    assert means[:2].tolist() == [4.0, 3.0]
+    assert values[0].tolist() == [1, 9]
+    assert values[1].tolist() == [3, 3]
+    assert np.isnan(values[2]).all()
+
+
+def test_vendor_lead_times_match_sorted_rows():
+    df = purchase_orders()
+    by_vendor = engine.compute_lead_time_tables(df)["lead_time_by_vendor"].set_index("VendorName")
+    received = df.dropna(subset=["RecDate", "VendorName"])
+    lead_days = (received["RecDate"] - received["OrderDate"]).dt.days
+    for vendor, days in lead_days.groupby(received["VendorName"], observed=True):
+        assert by_vendor.loc[vendor, "Received Lines"] == len(days)
+        for percentile in engine.LEAD_TIME_PERCENTILES:
+            nearest_rank = np.sort(days.to_numpy())[max(-(-percentile * len(days) // 100), 1) - 1]
+            assert by_vendor.loc[vendor, f"Lead Time p{percentile}"] == nearest_rank
+
+
+def test_late_order_pages_cover_every_row_once():
+    assert engine.late_order_page_count(0, 25) == 1
+    assert engine.late_order_page_count(50, 25) == 2
+    assert engine.late_order_page_count(51, 25) == 3
+    positions = np.arange(51)
+    pages = [engine.late_order_page(positions, page, 25) for page in range(1, 4)]
+    assert [start for _, start in pages] == [0, 25, 50]
+    assert np.concatenate([rows for rows, _ in pages]).tolist() == positions.tolist()
+    assert pages[-1][0].tolist() == [50]
+
+
+def test_late_order_page_clamps_out_of_range_pages():
+    positions = np.arange(30)
+    last, start = engine.late_order_page(positions, 9, 25)
+    assert (last.tolist(), start) == (list(range(25, 30)), 25)
+    first, start = engine.late_order_page(positions, 0, 25)
+    assert (first.tolist(), start) == (list(range(25)), 0)
+    empty, start = engine.late_order_page(positions[:0], 3, 25)
+    assert (len(empty), start) == (0, 0)
+
+
+def test_late_order_positions_search_and_sort_missing_last():
+    late_orders = pd.DataFrame(
+        {
+            "PONumber": ["P1", "P2", "P3", "P4"],
+            "VendorName": ["Acme", "Bolt", "acme supply", None],
+            "Days Late": [3.0, np.nan, 9.0, 1.0],
+        }
+    )
+    index = engine.build_late_order_index(late_orders)
+    assert engine.late_order_positions(index, "", "Days Late", True).tolist() == [2, 0, 3, 1]
+    assert engine.late_order_positions(index, "", "Days Late", False).tolist() == [3, 0, 2, 1]
+    assert engine.late_order_positions(index, " ACME ", "Days Late", True).tolist() == [2, 0]
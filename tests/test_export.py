@@ -0,0 +1,62 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import app
+
+
+def export_rows():
+    return pd.DataFrame(
+        {
+            "PONumber": ["P1", "P2", "P3", "P4", "P5"],
+            "OrderDate": pd.to_datetime(["2023-01-05", None, "2023-02-10", "2023-03-01", "2023-03-02"]),
+            "VendorName": pd.Categorical(["Acme", "Bolt", "Acme", None, "Bolt"]),
+            "Total": [10.5, np.nan, 0.25, 1200.0, -3.0],
+        }
+    )
+
+
+def test_csv_export_writes_one_header_across_chunks():
+    df = export_rows()
+    data = app.export_filtered_data(df, "CSV", chunk_rows=2).getvalue()
+    assert data.decode("utf-8").count("PONumber") == 1
+    result = pd.read_csv(io.BytesIO(data), parse_dates=["OrderDate"])
+    expected = df.assign(VendorName=df["VendorName"].astype(object))
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_parquet_export_writes_row_groups():
+    df = export_rows()
+    buffer = app.export_filtered_data(df, "Parquet", chunk_rows=2)
+    assert pq.ParquetFile(buffer).num_row_groups == 3
+    buffer.seek(0)
+    pd.testing.assert_frame_equal(pd.read_parquet(buffer), df)
+
+
+def test_excel_export_round_trips():
+    df = export_rows()
+    buffer = app.export_filtered_data(df, "Excel", chunk_rows=2)
+    result = pd.read_excel(buffer, sheet_name="Purchase Orders")
+    expected = df.assign(VendorName=df["VendorName"].astype(object))
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_empty_frame_exports_headers_only():
+    df = export_rows().iloc[:0]
+    result = pd.read_csv(app.export_filtered_data(df, "CSV", chunk_rows=2))
+    assert list(result.columns) == list(df.columns)
+    assert result.empty
+
+
+def test_excel_export_refuses_too_many_rows(monkeypatch):
+    monkeypatch.setattr(app, "EXCEL_MAX_ROWS", 4)
+    with pytest.raises(ValueError, match="at most 4 rows"):
+        app.export_filtered_data(export_rows(), "Excel")
+
+
+def test_unknown_export_format_is_rejected():
+    with pytest.raises(ValueError, match="Unknown export format"):
+        app.export_filtered_data(export_rows(), "JSON")
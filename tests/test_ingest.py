@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+import app
+import ingest
+from ingest import SKIPPED_HASH_COLUMN, read_source_frame
+
+# No line column, so the rows are told apart by the skipped "Buyer Notes" too
+HEADER = "PONumber,OrderDate,Total,Buyer Notes\n"
+
+
+def test_skipped_columns_are_hashed_while_parsing():
+    frame = read_source_frame(
+        "po.csv", (HEADER + "P1,2023-01-05,10.0,rush\nP1,2023-01-05,10.0,rush\nP1,2023-01-05,10.0,hold\n").encode()
+    )
+    assert "Buyer Notes" not in frame.columns
+    hashes = frame[SKIPPED_HASH_COLUMN].to_numpy()
+    assert hashes.dtype == np.uint64
+    assert hashes[0] == hashes[1] != hashes[2]
+
+
+def test_skipped_hash_ignores_numeric_rendering():
+    # Workbook readers may hand the same cell back as 3 or 3.0
+    as_int = ingest._project_frame(pd.DataFrame({"PONumber": ["P1"], "Qty Billed": [3]}), ["PONumber"])
+    as_float = ingest._project_frame(pd.DataFrame({"PONumber": ["P1"], "Qty Billed": [3.0]}), ["PONumber"])
+    assert as_int[SKIPPED_HASH_COLUMN].iloc[0] == as_float[SKIPPED_HASH_COLUMN].iloc[0]
+
+
+def test_deduplicate_rows_keeps_rows_that_differ_only_in_skipped_columns():
+    frame = read_source_frame(
+        "po.csv", (HEADER + "P1,2023-01-05,10.0,rush\nP1,2023-01-05,10.0,rush\nP1,2023-01-05,10.0,hold\n").encode()
+    )
+    frame["__source__"] = "po.csv"
+    deduped, removed = app.deduplicate_rows(frame)
+    assert len(deduped) == 2
+    assert removed == {"po.csv": 1}
+
+
+def test_deduplicate_rows_counts_repeats_against_the_later_source():
+    first = read_source_frame("jan.csv", (HEADER + "P1,2023-01-05,10.0,rush\n").encode())
+    second = read_source_frame("feb.csv", (HEADER + "P1,2023-01-05,10.0,rush\nP2,2023-02-01,5.0,\n").encode())
+    first["__source__"] = "jan.csv"
+    second["__source__"] = "feb.csv"
+    deduped, removed = app.deduplicate_rows(pd.concat([first, second], ignore_index=True))
+    assert deduped["PONumber"].tolist() == ["P1", "P2"]
+    assert removed == {"feb.csv": 1}
+
+
+def test_csv_with_line_column_reads_only_manifest_columns(monkeypatch):
+    read_columns = []
+    read_csv = ingest.pa_csv.read_csv
+
+    def recording_read_csv(*args, **kwargs):
+        read_columns.append(list(kwargs["convert_options"].include_columns))
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(ingest.pa_csv, "read_csv", recording_read_csv)
+    frame = read_source_frame(
+        "po.csv", b"PONumber,POLine,OrderDate,Total,Buyer Notes\nP1,1,2023-01-05,10.0,rush\nP1,2,2023-01-05,4.0,hold\n"
+    )
+    assert read_columns == [["PONumber", "POLine", "OrderDate", "Total"]]
+    assert frame[SKIPPED_HASH_COLUMN].tolist() == [0, 0]
+
+
+def test_csv_projection_matches_the_pandas_reader(monkeypatch):
+    payload = b"PONumber,Line,OrderDate,Total,Acct,Buyer Notes\nP1,1,01/05/2023,10.5,12-34,rush\nP2,1,01/06/2023,,,\n"
+    with_arrow = read_source_frame("po.csv", payload)
+    monkeypatch.setattr(ingest, "pa_csv", None)
+    with_pandas = read_source_frame("po.csv", payload)
+    pd.testing.assert_frame_equal(with_arrow, with_pandas, check_categorical=False)
+    assert "Buyer Notes" not in with_pandas.columns
+
+
+def test_coerce_date_column_detects_the_text_format():
+    parsed, fmt = ingest.coerce_date_column(pd.Series(["01/05/2023", "12/31/2022", "01/05/2023", None]))
+    assert fmt == "%m/%d/%Y"
+    assert parsed.dtype == "datetime64[ns]"
+    assert parsed.tolist()[:3] == [pd.Timestamp("2023-01-05"), pd.Timestamp("2022-12-31"), pd.Timestamp("2023-01-05")]
+    assert pd.isna(parsed.iloc[3])
+
+
+def test_coerce_date_column_falls_back_to_mixed_parsing_per_value():
+    values = pd.Series(["2023-01-05", "2023-02-10", " 03/15/2023 ", "not a date", ""])
+    parsed, fmt = ingest.coerce_date_column(values)
+    assert fmt == "%Y-%m-%d"
+    assert parsed.tolist()[:3] == [pd.Timestamp("2023-01-05"), pd.Timestamp("2023-02-10"), pd.Timestamp("2023-03-15")]
+    assert parsed.iloc[3:].isna().all()
+
+
+def test_coerce_date_column_keeps_a_given_format():
+    # Later chunks of a source reuse the format detected on the first one
+    parsed, fmt = ingest.coerce_date_column(pd.Series(["05-Jan-2023"]), "%d-%b-%Y")
+    assert fmt == "%d-%b-%Y"
+    assert parsed.iloc[0] == pd.Timestamp("2023-01-05")
+
+
+def test_coerce_date_column_normalizes_datetimes_and_excel_cells():
+    stamps = pd.Series(pd.to_datetime(["2023-01-05 13:45", "2023-01-06 00:00"]).as_unit("us"))
+    parsed, fmt = ingest.coerce_date_column(stamps)
+    assert fmt is None
+    assert parsed.dtype == "datetime64[ns]"
+    assert parsed.tolist() == [pd.Timestamp("2023-01-05"), pd.Timestamp("2023-01-06")]
+
+    cells = pd.Series([pd.Timestamp("2023-01-05 08:00").to_pydatetime(), "2023-01-07"], dtype=object)
+    parsed, _ = ingest.coerce_date_column(cells)
+    assert parsed.tolist() == [pd.Timestamp("2023-01-05"), pd.Timestamp("2023-01-07")]
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = tmp_path / "store" / "purchase_orders.parquet"
+    monkeypatch.setattr(app, "STORE_PATH", path)
+    return path
+
+
+def po_lines(source, rows):
+    frame = pd.DataFrame(rows, columns=["PONumber", "POLine", "OrderDate", "Total", "POStatus"])
+    frame["OrderDate"] = pd.to_datetime(frame["OrderDate"])
+    frame["__source__"] = source
+    return app.apply_processed_schema(frame)
+
+
+def test_first_append_adds_every_row(store_path):
+    merged, stats = app.append_to_store(
+        po_lines("jan.xlsx", [("P1", "1", "2023-01-05", 10.0, "OPEN"), ("P1", "2", "2023-01-05", 4.0, "OPEN")])
+    )
+    assert stats == {"rows_before": 0, "added": 2, "updated": 0, "unchanged": 0, "rows_after": 2}
+    assert store_path.exists()
+    assert len(merged) == 2
+
+
+def test_reexported_lines_are_upserted(store_path):
+    app.append_to_store(
+        po_lines("jan.xlsx", [("P1", "1", "2023-01-05", 10.0, "OPEN"), ("P1", "2", "2023-01-05", 4.0, "OPEN")])
+    )
+    merged, stats = app.append_to_store(
+        po_lines(
+            "feb.xlsx",
+            [
+                ("P1", "1", "2023-01-05", 10.0, "OPEN"),
+                ("P1", "2", "2023-01-05", 4.0, "RECEIVED"),
+                ("P2", "1", "2023-02-01", 7.5, "NEW"),
+            ],
+        )
+    )
+    assert stats == {"rows_before": 2, "added": 1, "updated": 1, "unchanged": 1, "rows_after": 3}
+    line = merged[(merged["PONumber"] == "P1") & (merged["POLine"] == "2")]
+    assert line["POStatus"].tolist() == ["RECEIVED"]
+    assert line["__source__"].tolist() == ["feb.xlsx"]
+    assert len(app.load_store()) == 3
+
+
+def test_store_is_sorted_by_order_date(store_path):
+    app.append_to_store(po_lines("feb.xlsx", [("P2", "1", "2023-02-01", 7.5, "NEW")]))
+    merged, _ = app.append_to_store(po_lines("jan.xlsx", [("P1", "1", "2023-01-05", 10.0, "OPEN")]))
+    assert merged["PONumber"].tolist() == ["P1", "P2"]
+    assert not list(store_path.parent.glob("*.tmp"))
+
+
+def test_upload_without_line_numbers_is_refused(store_path):
+    app.append_to_store(po_lines("jan.xlsx", [("P1", "1", "2023-01-05", 10.0, "OPEN")]))
+    unnumbered = po_lines("feb.xlsx", [("P1", "1", "2023-01-05", 99.0, "RECEIVED")]).drop(columns="POLine")
+    with pytest.raises(ValueError, match="POLine"):
+        app.append_to_store(unnumbered)
+    assert app.load_store()["Total"].tolist() == [10.0]